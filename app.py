@@ -1,33 +1,142 @@
 from flask import Flask, render_template, request, jsonify
 import os
-import joblib
-import numpy as np
+import gc
+import threading
 import warnings
 from config import Config
 from datetime import datetime
+from profiling import init_request_profiling
+from validation import ValidationError, init_validation, rejections, validate_json_payload, validate_row
+
+# NumPy, joblib and scikit-learn are imported lazily by the loader and the
+# prediction routes so the server can answer /healthz before they are ready.
 
 warnings.filterwarnings("ignore")
 
 app = Flask(__name__)
 app.config.from_object(Config)
-model = joblib.load("model.pkl")
+init_request_profiling(app)
+init_validation(app)
+
+# Model and knowledge processor are loaded in the background (or preloaded)
+model = None
+feature_schema = None
+recommender = None
+drift_monitor = None
+model_ready = threading.Event()
+model_error = None
 
-# Initialize knowledge processor (lazy loading)
 knowledge_processor = None
+knowledge_ready = threading.Event()
+_knowledge_lock = threading.Lock()
+
+def load_model():
+    """Load the trained crop model, its feature schema and recommender from disk"""
+    global model, feature_schema, recommender, drift_monitor, model_error
+    try:
+        import joblib
+        from feature_schema import load_schema_for
+        from monitoring import DriftMonitor, reference_path_for
+        from recommender import load_recommender
+
+        loaded_model = joblib.load(app.config['MODEL_PATH'])
+        schema = load_schema_for(app.config['MODEL_PATH'])
+        n_model_features = getattr(loaded_model, 'n_features_in_', schema.n_features)
+        if n_model_features != schema.n_features:
+            raise ValueError(f"model expects {n_model_features} features but schema v{schema.version} "
+                             f"has {schema.n_features}")
+
+        recommender = load_recommender(loaded_model, schema, app.config['MODEL_PATH'])
+        if not app.config['RECOMMEND_USE_LUT']:
+            recommender.lut = None
+
+        if app.config['MONITOR_ENABLED']:
+            drift_monitor = DriftMonitor.load(reference_path_for(app.config['MODEL_PATH']), schema.features,
+                                              recommender.classes, snapshot_dir=app.config['MONITOR_DIR'],
+                                              snapshot_seconds=app.config['MONITOR_SNAPSHOT_SECONDS'],
+                                              min_rows=app.config['MONITOR_MIN_ROWS'])
+
+        feature_schema = schema
+        model = loaded_model
+        print(f"🌾 Model loaded from {app.config['MODEL_PATH']} (features: {', '.join(schema.features)})")
+    except Exception as e:
+        model_error = str(e)
+        print(f"❌ Could not load model: {model_error}")
+    finally:
+        model_ready.set()
+
+def get_model():
+    """Return the loaded model, waiting briefly if it is still loading"""
+    model_ready.wait(app.config['MODEL_WAIT_SECONDS'])
+    return model
 
 def get_knowledge_processor():
     """Lazy load the knowledge processor"""
     global knowledge_processor
     if knowledge_processor is None:
-        try:
-            from knowledge_processor import AgricultureKnowledgeProcessor
-            knowledge_processor = AgricultureKnowledgeProcessor()
-            print("🧠 Knowledge processor initialized")
-        except Exception as e:
-            print(f"⚠️  Could not initialize knowledge processor: {str(e)}")
-            knowledge_processor = None
+        with _knowledge_lock:
+            if knowledge_processor is None:
+                try:
+                    from knowledge_processor import AgricultureKnowledgeProcessor
+                    processor = AgricultureKnowledgeProcessor()
+                    processor.load_embedding_model()
+                    knowledge_processor = processor
+                    print("🧠 Knowledge processor initialized")
+                except Exception as e:
+                    print(f"⚠️  Could not initialize knowledge processor: {str(e)}")
+                    knowledge_processor = None
+                finally:
+                    knowledge_ready.set()
     return knowledge_processor
 
+def prepare_inputs(input_data):
+    """Bin validated rows for drift monitoring; missing optional features stay NaN for the recommender"""
+    return drift_monitor.cells(input_data) if drift_monitor is not None else None
+
+def observe(cells, predictions):
+    """Record served inputs and predictions for drift monitoring"""
+    if cells is not None:
+        drift_monitor.observe(cells, predictions)
+
+def load_resources():
+    """Load the model and, if enabled, the retrieval stack"""
+    load_model()
+    if app.config['PRELOAD_KNOWLEDGE']:
+        get_knowledge_processor()
+
+def load_knowledge_in_background():
+    """Initialize the retrieval stack on a background thread of the current process"""
+    threading.Thread(target=get_knowledge_processor, name="knowledge-loader", daemon=True).start()
+
+if app.config['PRELOAD']:
+    # Preload-then-fork: load the model in the master process so forked workers
+    # share the pages copy-on-write, and freeze them out of the GC's reach so
+    # collections in the workers don't touch (and copy) those pages. The retrieval
+    # stack (Chroma's SQLite handle and threads, torch) is not fork-safe, so each
+    # worker loads it after the fork (post_fork in gunicorn.conf.py).
+    load_model()
+    gc.freeze()
+else:
+    threading.Thread(target=load_resources, name="resource-loader", daemon=True).start()
+
+@app.route('/healthz')
+def healthz():
+    """Liveness probe, answers as soon as the process is up"""
+    return jsonify({"status": "ok"})
+
+@app.route('/readyz')
+def readyz():
+    """Readiness probe, flips once the model (and optional retrieval stack) is loaded"""
+    components = {"model": model_ready.is_set() and model is not None}
+    if app.config['PRELOAD_KNOWLEDGE']:
+        components["knowledge"] = knowledge_ready.is_set() and knowledge_processor is not None
+
+    ready = all(components.values())
+    body = {"status": "ready" if ready else "loading", "components": components}
+    if model_error:
+        body["model_error"] = model_error
+    return jsonify(body), 200 if ready else 503
+
 @app.route('/')
 def home():
     return render_template('index.html')
@@ -44,44 +153,95 @@ def chat():
 def predict():
     if request.method == 'GET':
         return render_template('predict.html')
-    try:
-        if request.form.get('temperature'):
-            temp = float(request.form['temperature'])
-            humidity = float(request.form['humidity'])
-            ph = float(request.form['ph'])
-            rainfall = float(request.form['rainfall'])
-        else:
-            temp = float(request.form.get('temperatureManual', 0))
-            humidity = float(request.form.get('humidityManual', 0))
-            ph = float(request.form.get('ph', 0))
-            rainfall = float(request.form.get('rainfall', 0))
-
-        input_data = np.array([[temp, humidity, ph, rainfall]])
-        prediction = model.predict(input_data)[0]
-
-        blog_suggestions = [
-            {"title": "Top 10 Tips for Successful Farming", "url": "https://exampleblog.com/farming-tips"},
-            {"title": "How to Improve Soil Quality", "url": "https://exampleblog.com/soil-quality"},
-            {"title": "Pest Control Methods for Crops", "url": "https://exampleblog.com/pest-control"}
-        ]
-        video_suggestions = [
-            {"title": "Farming Basics for Beginners", "url": "https://www.youtube.com/watch?v=example1"},
-            {"title": "Advanced Crop Management", "url": "https://www.youtube.com/watch?v=example2"},
-            {"title": "Sustainable Agriculture Practices", "url": "https://www.youtube.com/watch?v=example3"}
-        ]
-
-        return render_template('result.html', prediction=prediction, blogs=blog_suggestions, videos=video_suggestions)
-    except Exception as e:
-        return f"Error: {e}"
+    current_model = get_model()
+    if current_model is None:
+        return "Error: model is not available yet, please try again shortly", 503
+
+    input_data = validate_row(feature_schema, request.form, impute=False)
+    cells = prepare_inputs(input_data)
+    predictions = recommender.predict(input_data)
+    observe(cells, predictions)
+    prediction = predictions[0]
+
+    blog_suggestions = [
+        {"title": "Top 10 Tips for Successful Farming", "url": "https://exampleblog.com/farming-tips"},
+        {"title": "How to Improve Soil Quality", "url": "https://exampleblog.com/soil-quality"},
+        {"title": "Pest Control Methods for Crops", "url": "https://exampleblog.com/pest-control"}
+    ]
+    video_suggestions = [
+        {"title": "Farming Basics for Beginners", "url": "https://www.youtube.com/watch?v=example1"},
+        {"title": "Advanced Crop Management", "url": "https://www.youtube.com/watch?v=example2"},
+        {"title": "Sustainable Agriculture Practices", "url": "https://www.youtube.com/watch?v=example3"}
+    ]
+
+    return render_template('result.html', prediction=prediction, blogs=blog_suggestions, videos=video_suggestions)
 
 @app.route('/api/predict', methods=['POST'])
 def api_predict():
-    data = request.get_json()
-    input_data = np.array([[data['temperature'], data['humidity'], data['ph'], data['rainfall']]])
-    prediction = model.predict(input_data)[0]
-    return jsonify({"crop": prediction})
+    """Crop for one feature object, or crops for an "instances"/"columns" batch"""
+    current_model = get_model()
+    if current_model is None:
+        return jsonify({"error": "model not ready"}), 503
+
+    input_data, is_batch = validate_json_payload(feature_schema, request.get_json(silent=True),
+                                                 app.config['MAX_BATCH_SIZE'], impute=False)
+    cells = prepare_inputs(input_data)
+    predictions = recommender.predict(input_data)
+    observe(cells, predictions)
+    if is_batch:
+        return jsonify({"crops": [str(crop) for crop in predictions]})
+    return jsonify({"crop": predictions[0]})
+
+@app.route('/api/recommend', methods=['POST'])
+def api_recommend():
+    """Top-k crop recommendations with calibrated confidences"""
+    current_model = get_model()
+    if current_model is None:
+        return jsonify({"error": "model not ready"}), 503
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        raise ValidationError('invalid_json', "Expected a JSON object")
+
+    try:
+        k = data.get('k', app.config['RECOMMEND_TOP_K'])
+        if isinstance(k, bool) or float(k) != int(k):
+            raise ValueError(k)
+        k = int(k)
+    except (TypeError, ValueError, OverflowError):
+        raise ValidationError('invalid_value', "k must be an integer", field='k')
+    if not 1 <= k <= app.config['RECOMMEND_MAX_K']:
+        raise ValidationError('out_of_range', f"k must be between 1 and {app.config['RECOMMEND_MAX_K']}", field='k')
+    input_data = validate_row(feature_schema, data, impute=False)
+    cells = prepare_inputs(input_data)
+
+    recommendations, from_lookup = recommender.recommend(input_data, k)
+    observe(cells, [recommendations[0]['crop']])
+    return jsonify({
+        "crop": recommendations[0]['crop'],
+        "recommendations": recommendations,
+        "source": "lookup" if from_lookup else "model"
+    })
+
+@app.route('/drift')
+def drift():
+    """Drift of served inputs and predictions against the training data (PSI per feature)"""
+    if drift_monitor is None:
+        return jsonify({"error": "drift monitoring is not available (no drift_reference.npz for this model)"}), 404
+    return jsonify(drift_monitor.drift())
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus counters of rejected prediction requests and drift gauges"""
+    lines = rejections.prometheus_lines()
+    if drift_monitor is not None:
+        lines += drift_monitor.prometheus_lines()
+    return "\n".join(lines) + "\n", 200, {"Content-Type": "text/plain; version=0.0.4"}
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     print(f"🌐 Starting Farmer Guider AI Flask application on port {port}...")
+    if app.config['PRELOAD'] and app.config['PRELOAD_KNOWLEDGE']:
+        # No fork happens here, so load the retrieval stack in this process
+        load_knowledge_in_background()
     app.run(host='0.0.0.0', port=port)
@@ -0,0 +1,473 @@
+#!/usr/bin/env python3
+"""
+Benchmark Suite for Farmer Guider AI
+Measures prediction, training, crawl and retrieval performance and compares runs against a baseline
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime
+from importlib import metadata
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Metric name suffixes decide which direction counts as a regression
+HIGHER_IS_BETTER = ('_per_sec', '_qps', '_recall')
+LOWER_IS_BETTER = ('_ms', '_seconds')
+
+SAMPLE_INPUT = {'temperature': 25.0, 'humidity': 80.0, 'ph': 6.5, 'rainfall': 200.0}
+
+WORDS = (
+    "soil crop rice wheat maize cotton irrigation fertilizer nitrogen phosphorus potassium "
+    "harvest monsoon rainfall yield seed pest organic compost drip tillage sowing mulch "
+    "farmer market price scheme subsidy weather humidity temperature disease fungus "
+    "pulses millet sugarcane soybean groundwater canal tractor storage warehouse export"
+).split()
+
+# Synthetic terms keep query windows distinctive enough for a meaningful recall figure
+VOCABULARY = WORDS + [f"agriterm{i}" for i in range(3000)]
+
+
+class HashingEncoder:
+    """Tiny deterministic stand-in for SentenceTransformer used by the retrieval benchmarks"""
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def encode(self, texts, show_progress_bar=False):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in text.lower().split():
+                vectors[row, zlib.crc32(token.encode('utf-8')) % self.dim] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+def machine_info():
+    """Collect the machine and package details stored alongside every result file"""
+    packages = {}
+    for name in ('numpy', 'scikit-learn', 'pandas', 'flask', 'beautifulsoup4', 'chromadb', 'sentence-transformers'):
+        try:
+            packages[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            packages[name] = None
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        commit = None
+
+    return {
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'git_commit': commit,
+        'packages': packages
+    }
+
+
+def latency_stats(samples_ms):
+    """Summarize per-call latencies in milliseconds"""
+    samples = np.asarray(samples_ms)
+    return {
+        'p50_ms': round(float(np.percentile(samples, 50)), 4),
+        'p95_ms': round(float(np.percentile(samples, 95)), 4),
+        'p99_ms': round(float(np.percentile(samples, 99)), 4),
+        'mean_ms': round(float(samples.mean()), 4)
+    }
+
+
+def random_text(rng, n_words):
+    return ' '.join(rng.choice(VOCABULARY) for _ in range(n_words))
+
+
+def make_articles(n_articles, words_per_article, seed=42):
+    """Build a synthetic article corpus shaped like agriculture_knowledge_base.json"""
+    rng = random.Random(seed)
+    categories = ['Educational', 'News', 'Government']
+    return [{
+        'title': f"Synthetic article {i}",
+        'content': random_text(rng, words_per_article),
+        'url': f"https://bench.local/article/{i}",
+        'source': f"bench-{i % 5}",
+        'category': categories[i % len(categories)],
+        'scraped_at': datetime(2024, 1, 1 + i % 28).isoformat()
+    } for i in range(n_articles)]
+
+
+def make_html_pages(n_pages, seed=42):
+    """Build a local HTML fixture corpus that exercises the different extraction selectors"""
+    rng = random.Random(seed)
+    wrappers = [
+        ('<article>', '</article>'),
+        ('<div class="entry-content">', '</div>'),
+        ('<main>', '</main>'),
+        ('', '')  # no content container, forces the paragraph fallback
+    ]
+    pages = []
+    for i in range(n_pages):
+        open_tag, close_tag = wrappers[i % len(wrappers)]
+        paragraphs = ''.join(f"<p>{random_text(rng, 60)}</p>" for _ in range(12))
+        pages.append(
+            "<html><head><title>Bench</title><style>p{color:red}</style></head><body>"
+            "<header><nav><a href='/'>Home</a><a href='/news'>News</a></nav></header>"
+            f"{open_tag}<h1>Article {i}</h1>{paragraphs}"
+            "<script>var tracking = 1;</script><aside class='ads'>Buy seeds now</aside>"
+            f"{close_tag}<footer>Copyright</footer></body></html>"
+        )
+    return pages
+
+
+def bench_predict(n_requests):
+    """Single-request latency and sequential throughput of /api/predict"""
+    import app as farm_app
+
+    client = farm_app.app.test_client()
+    for _ in range(20):
+        client.post('/api/predict', json=SAMPLE_INPUT)
+
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(n_requests):
+        t0 = time.perf_counter()
+        response = client.post('/api/predict', json=SAMPLE_INPUT)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/predict returned {response.status_code}")
+    elapsed = time.perf_counter() - start
+
+    result = latency_stats(latencies)
+    result['requests'] = n_requests
+    result['throughput_per_sec'] = round(n_requests / elapsed, 2)
+
+    # Batch mode: one request carrying many instances
+    batch = {'instances': [SAMPLE_INPUT] * 500}
+    n_batches = max(1, n_requests // 50)
+    start = time.perf_counter()
+    for _ in range(n_batches):
+        response = client.post('/api/predict', json=batch)
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/predict batch returned {response.status_code}")
+    result['batch_rows_per_sec'] = round(n_batches * len(batch['instances']) / (time.perf_counter() - start), 2)
+    return result
+
+
+def bench_train(sizes):
+    """Wall time of train_enhanced_model() for several dataset sizes"""
+    import pandas as pd
+    import train_model
+
+    source = pd.read_csv(os.path.join(REPO_DIR, 'enhanced_farmer_data.csv'))
+    source = source[['temperature', 'humidity', 'ph', 'rainfall', 'label']].dropna()
+
+    result = {}
+    original_dir = os.getcwd()
+    for size in sizes:
+        work_dir = tempfile.mkdtemp(prefix='farmhelp_bench_')
+        try:
+            source.sample(n=size, replace=size > len(source), random_state=42).to_csv(
+                os.path.join(work_dir, 'farmer_data.csv'), index=False)
+            os.chdir(work_dir)
+            np.random.seed(42)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                train_model.train_enhanced_model()
+            result[f"rows_{size}_seconds"] = round(time.perf_counter() - start, 4)
+        finally:
+            os.chdir(original_dir)
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return result
+
+
+def bench_crawl(n_pages):
+    """Pages per second for HTML parsing plus extract_article_content()"""
+    from bs4 import BeautifulSoup
+    from data_collector import AgricultureDataCollector
+
+    collector = AgricultureDataCollector()
+    pages = make_html_pages(n_pages)
+
+    start = time.perf_counter()
+    extracted = 0
+    for i, html in enumerate(pages):
+        soup = BeautifulSoup(html, 'html.parser')
+        if collector.extract_article_content(soup, f"https://bench.local/{i}"):
+            extracted += 1
+    elapsed = time.perf_counter() - start
+
+    return {
+        'pages': n_pages,
+        'extracted': extracted,
+        'pages_per_sec': round(n_pages / elapsed, 2)
+    }
+
+
+def bench_chunk_encode(n_articles, words_per_article):
+    """Throughput of chunk_text() followed by encoding with the hashing encoder"""
+    from knowledge_processor import AgricultureKnowledgeProcessor
+
+    articles = make_articles(n_articles, words_per_article)
+    processor = AgricultureKnowledgeProcessor(persist_directory=None,
+                                              collection_name=f"bench_chunk_{os.getpid()}")
+    encoder = HashingEncoder()
+
+    start = time.perf_counter()
+    chunks = []
+    for article in articles:
+        chunks.extend(processor.chunk_text(processor.preprocess_text(article['content'])))
+    chunk_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    encoder.encode(chunks)
+    encode_elapsed = time.perf_counter() - start
+
+    return {
+        'articles': n_articles,
+        'chunks': len(chunks),
+        'chunk_articles_per_sec': round(n_articles / chunk_elapsed, 2),
+        'encode_chunks_per_sec': round(len(chunks) / encode_elapsed, 2)
+    }
+
+
+def bench_search(n_articles, n_queries, k=5):
+    """QPS and recall@k of search_knowledge_base() over an in-memory collection"""
+    from knowledge_processor import AgricultureKnowledgeProcessor
+
+    articles = make_articles(n_articles, 800)
+    processor = AgricultureKnowledgeProcessor(persist_directory=None,
+                                              collection_name=f"bench_search_{os.getpid()}")
+    processor.embedding_model = HashingEncoder()
+    with contextlib.redirect_stdout(io.StringIO()):
+        processor.add_to_knowledge_base(articles)
+
+    # Each query is an exact window of one article, so a hit is any result containing it
+    rng = random.Random(7)
+    queries = []
+    for _ in range(n_queries):
+        words = rng.choice(articles)['content'].split()
+        offset = rng.randrange(0, len(words) - 12)
+        queries.append(' '.join(words[offset:offset + 12]))
+
+    hits = 0
+    latencies = []
+    start = time.perf_counter()
+    for query in queries:
+        t0 = time.perf_counter()
+        results = processor.search_knowledge_base(query, n_results=k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        if any(query in result['content'] for result in results):
+            hits += 1
+    elapsed = time.perf_counter() - start
+
+    result = latency_stats(latencies)
+    result.update({
+        'chunks': processor.get_stats().get('total_chunks', 0),
+        'queries': n_queries,
+        'search_qps': round(n_queries / elapsed, 2),
+        f"top{k}_recall": round(hits / n_queries, 4)
+    })
+    return result
+
+
+def bench_filtered_search(n_articles, n_queries, k=5, overfetch=10):
+    """Latency of store-side metadata filters versus over-fetching and filtering afterwards"""
+    from knowledge_processor import AgricultureKnowledgeProcessor
+
+    articles = make_articles(n_articles, 800)
+    processor = AgricultureKnowledgeProcessor(persist_directory=None,
+                                              collection_name=f"bench_filter_{os.getpid()}")
+    processor.embedding_model = HashingEncoder()
+    with contextlib.redirect_stdout(io.StringIO()):
+        processor.add_to_knowledge_base(articles)
+
+    # Selective filter: one of five sources and chunks mentioning rice
+    filters = {'source': 'bench-0', 'crop': 'rice'}
+    where = processor.build_filter(**filters)
+    matching = len(processor.collection.get(where=where, include=[])['ids'])
+    total = processor.collection.count()
+
+    rng = random.Random(11)
+    queries = [random_text(rng, 12) for _ in range(n_queries)]
+
+    filtered_latencies = []
+    filtered_ids = []
+    for query in queries:
+        t0 = time.perf_counter()
+        results = processor.search_knowledge_base(query, n_results=k, **filters)
+        filtered_latencies.append((time.perf_counter() - t0) * 1000)
+        filtered_ids.append({(r['url'], r['chunk_index']) for r in results})
+
+    overfetch_latencies = []
+    found = 0
+    filled = 0
+    for query, expected in zip(queries, filtered_ids):
+        t0 = time.perf_counter()
+        results = [r for r in processor.search_knowledge_base(query, n_results=k * overfetch)
+                   if r['source'] == filters['source'] and f"crop_{filters['crop']}" in
+                   processor.crop_flags(r['content'])][:k]
+        overfetch_latencies.append((time.perf_counter() - t0) * 1000)
+        filled += len(results) == k
+        found += len(expected & {(r['url'], r['chunk_index']) for r in results})
+
+    filtered = latency_stats(filtered_latencies)
+    overfetch = latency_stats(overfetch_latencies)
+    return {
+        'chunks': total,
+        'selectivity': round(matching / max(total, 1), 4),
+        'queries': n_queries,
+        'filtered_p50_ms': filtered['p50_ms'],
+        'filtered_p95_ms': filtered['p95_ms'],
+        'overfetch_p50_ms': overfetch['p50_ms'],
+        'overfetch_p95_ms': overfetch['p95_ms'],
+        # Share of the filtered top-k that a 10x over-fetch actually finds
+        'overfetch_recall': round(found / max(sum(len(ids) for ids in filtered_ids), 1), 4),
+        'overfetch_filled_share': round(filled / n_queries, 4)
+    }
+
+
+def build_suite(quick):
+    """Map benchmark names to zero-argument callables"""
+    scale = 1 if quick else 5
+    return {
+        'predict': lambda: bench_predict(200 * scale),
+        'train': lambda: bench_train([200] if quick else [200, 1000, 4000]),
+        'crawl': lambda: bench_crawl(40 * scale),
+        'chunk_encode': lambda: bench_chunk_encode(50 * scale, 2000),
+        'search': lambda: bench_search(40 * scale, 50 * scale),
+        'filtered_search': lambda: bench_filtered_search(200 * scale, 50 * scale)
+    }
+
+
+def run_suite(selected, quick):
+    """Run the selected benchmarks, recording skips instead of failing the whole suite"""
+    suite = build_suite(quick)
+    results = {}
+    for name in selected:
+        print(f"⏱️  Running benchmark: {name}")
+        try:
+            results[name] = suite[name]()
+            print(f"   {results[name]}")
+        except ImportError as e:
+            results[name] = {'skipped': f"missing dependency: {e}"}
+            print(f"   ⚠️  Skipped ({e})")
+        except Exception as e:
+            results[name] = {'error': str(e)}
+            print(f"   ❌ Failed: {e}")
+    return results
+
+
+def metric_direction(metric):
+    if metric.endswith(HIGHER_IS_BETTER):
+        return 1
+    if metric.endswith(LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def compare_results(current, baseline, threshold):
+    """Return a list of (benchmark, metric, baseline, current, change) regressions
+
+    A benchmark that errored or was skipped in the current run, or a baseline
+    metric the current run did not produce, counts as a regression with a
+    change of None.
+    """
+    if bool(current.get('quick')) != bool(baseline.get('quick')):
+        raise ValueError("Cannot compare a --quick run with a full run; their workloads differ")
+
+    regressions = []
+    for bench, metrics in current['results'].items():
+        base_metrics = baseline.get('results', {}).get(bench, {})
+        failure = metrics.get('error') or metrics.get('skipped')
+        if failure:
+            print(f"   ❌ {bench}: did not run ({failure})")
+            regressions.append((bench, None, None, None, None))
+            continue
+
+        for metric, base_value in base_metrics.items():
+            if metric_direction(metric) and isinstance(base_value, (int, float)) and metric not in metrics:
+                print(f"   ❌ {bench}.{metric}: missing from the current run")
+                regressions.append((bench, metric, base_value, None, None))
+
+        for metric, value in metrics.items():
+            direction = metric_direction(metric)
+            base_value = base_metrics.get(metric)
+            if not direction or not isinstance(value, (int, float)) or not isinstance(base_value, (int, float)) or not base_value:
+                continue
+
+            change = (value - base_value) / base_value
+            flag = '❌' if change * direction < -threshold else '✅'
+            print(f"   {flag} {bench}.{metric}: {base_value} -> {value} ({change:+.1%})")
+            if flag == '❌':
+                regressions.append((bench, metric, base_value, value, change))
+    return regressions
+
+
+def main():
+    suite_names = list(build_suite(quick=True).keys())
+
+    parser = argparse.ArgumentParser(description="Run the Farmer Guider AI benchmark suite")
+    parser.add_argument('--only', help=f"comma separated subset of: {', '.join(suite_names)}")
+    parser.add_argument('--quick', action='store_true', help="use small workloads for a fast smoke run")
+    parser.add_argument('--output', default='benchmark_results.json', help="where to write the results JSON")
+    parser.add_argument('--compare', metavar='BASELINE', help="compare against a stored baseline results JSON")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="relative slowdown that counts as a regression (default: 0.10)")
+    args = parser.parse_args()
+
+    selected = args.only.split(',') if args.only else suite_names
+    unknown = [name for name in selected if name not in suite_names]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    print("🚀 Starting Farmer Guider AI Benchmarks")
+    print("=" * 60)
+
+    report = {
+        'created_at': datetime.now().isoformat(),
+        'quick': args.quick,
+        'machine': machine_info(),
+        'results': run_suite(selected, args.quick)
+    }
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+        print("=" * 60)
+        print(f"📊 Comparing against {args.compare} (threshold {args.threshold:.0%})")
+        try:
+            regressions = compare_results(report, baseline, args.threshold)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return False
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) detected")
+            return False
+        print("✅ No regressions detected")
+
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
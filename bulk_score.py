@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Bulk Crop Scoring for Farmer Guider AI
+Scores region grids of weather/soil cells offline with the trained model, in parallel and resumably
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+
+from feature_schema import LEGACY_FEATURES, load_schema_for
+from recommender import load_recommender
+
+MANIFEST = 'manifest.json'
+
+# Bumped when the part file columns change, so old output directories are not resumed into
+PART_FORMAT = 2
+
+# Per-process state, set up once by init_worker
+_worker = {}
+
+
+def init_worker(model_path, use_lut):
+    """Load the model, schema and recommender once per worker process"""
+    import joblib
+
+    model = joblib.load(model_path)
+    schema = load_schema_for(model_path)
+    recommender = load_recommender(model, schema, model_path)
+    if not use_lut:
+        recommender.lut = None
+
+    _worker.update({'schema': schema, 'recommender': recommender})
+
+
+def to_features(columns, values):
+    """Place raw input columns into a float32 matrix in schema order
+
+    Returns (X, valid): rows with a blank required value or a value outside
+    the schema ranges are marked invalid; blank optional features stay NaN
+    so the recommender routes them to the schema's fallback model.
+    """
+    schema = _worker['schema']
+    X = np.full((len(values), schema.n_features), np.nan, dtype=np.float32)
+    for source, name in enumerate(columns):
+        if name in schema.index:
+            X[:, schema.index[name]] = values[:, source]
+    valid = ~schema.invalid_rows(X)
+    return X, valid
+
+
+def score_chunk(chunk_id, columns, values, source, top_k, output_dir):
+    """Score one chunk and write it as a columnar part file; returns (chunk_id, rows, invalid rows)"""
+    if values is None:
+        # Memory-mapped input: read this chunk's rows directly in the worker
+        path, start, stop = source
+        values = np.load(path, mmap_mode='r')[start:stop]
+
+    recommender = _worker['recommender']
+    X, valid = to_features(columns, np.asarray(values, dtype=np.float32))
+    k = min(top_k, recommender.n_classes)
+    indices = np.zeros((len(X), k), dtype=np.int64)
+    confidences = np.full((len(X), k), np.nan, dtype=np.float32)
+    if valid.any():
+        # Invalid rows are not scored: crop 0 with NaN confidence and valid=False
+        indices[valid], confidences[valid], _ = recommender.top_k(X[valid], top_k)
+
+    label_dtype = np.uint8 if recommender.n_classes <= 256 else np.uint16
+    part = {'crop': indices[:, 0].astype(label_dtype), 'confidence': confidences[:, 0].astype(np.float16),
+            'valid': valid}
+    for rank in range(1, indices.shape[1]):
+        part[f"crop_{rank + 1}"] = indices[:, rank].astype(label_dtype)
+        part[f"confidence_{rank + 1}"] = confidences[:, rank].astype(np.float16)
+
+    # Write to a temporary name first so an interrupted run never leaves a half-written part
+    final_path = os.path.join(output_dir, f"part-{chunk_id:05d}.npz")
+    temp_path = final_path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        np.savez(f, **part)
+    os.replace(temp_path, final_path)
+    return chunk_id, len(values), int(len(values) - valid.sum())
+
+
+def iter_chunks(input_path, chunk_size, columns):
+    """Yield (chunk_id, columns, values, source) without loading the whole input
+
+    For CSV input, ``columns`` lists the feature columns to read; other columns
+    (cell ids, coordinates) are ignored.
+    """
+    if input_path.endswith('.npy'):
+        array = np.load(input_path, mmap_mode='r')
+        if array.ndim != 2 or array.shape[1] != len(columns):
+            raise ValueError(f"{input_path} has shape {array.shape}, expected (rows, {len(columns)}) for columns {columns}")
+        for chunk_id, start in enumerate(range(0, array.shape[0], chunk_size)):
+            yield chunk_id, columns, None, (input_path, start, min(start + chunk_size, array.shape[0]))
+        return
+
+    import pandas as pd
+
+    for chunk_id, frame in enumerate(pd.read_csv(input_path, chunksize=chunk_size)):
+        frame_columns = [name for name in frame.columns if name in columns]
+        values = frame[frame_columns].apply(pd.to_numeric, errors='coerce')
+        # Non-numeric cells become +inf so the range check marks their rows invalid instead of imputing them
+        values = values.mask(values.isna() & frame[frame_columns].notna(), np.inf)
+        yield chunk_id, frame_columns, values.to_numpy(dtype=np.float32), None
+
+
+def check_columns(input_path, columns, schema):
+    """Fail before any work if the input cannot provide every required feature"""
+    unknown = [name for name in columns if name not in schema.index]
+    if unknown:
+        raise ValueError(f"Unknown feature columns {unknown}; the model expects {schema.features}")
+
+    if input_path.endswith('.npy'):
+        available = columns
+    else:
+        import pandas as pd
+
+        available = [name for name in pd.read_csv(input_path, nrows=0).columns if name in columns]
+    missing = [name for name in schema.required if name not in available]
+    if missing:
+        raise ValueError(f"{input_path} has no column for required features {missing}")
+
+
+def load_manifest(output_dir, settings):
+    """Return ({chunk_id: rows}, {chunk_id: invalid rows}) for completed chunks
+
+    Refuses to resume a run with different settings.
+    """
+    path = os.path.join(output_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {}, {}
+
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('settings') != settings:
+        raise ValueError(f"{output_dir} holds results for different settings; use a new output directory")
+
+    # Only trust parts that actually exist on disk
+    completed = {int(chunk_id): rows for chunk_id, rows in manifest.get('completed', {}).items()
+                 if os.path.exists(os.path.join(output_dir, f"part-{int(chunk_id):05d}.npz"))}
+    invalid = {int(chunk_id): rows for chunk_id, rows in manifest.get('invalid', {}).items()
+               if int(chunk_id) in completed}
+    return completed, invalid
+
+
+def save_manifest(output_dir, settings, classes, completed, invalid, finished=False):
+    path = os.path.join(output_dir, MANIFEST)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({
+            'settings': settings,
+            'classes': [str(c) for c in classes],
+            'completed': {str(chunk_id): completed[chunk_id] for chunk_id in sorted(completed)},
+            'rows': sum(completed.values()),
+            'invalid': {str(chunk_id): invalid[chunk_id] for chunk_id in sorted(invalid) if invalid[chunk_id]},
+            'invalid_rows': sum(invalid.values()),
+            'finished': finished
+        }, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def load_results(output_dir):
+    """Concatenate all part files of a finished run into one dict of columns"""
+    with open(os.path.join(output_dir, MANIFEST), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    chunk_ids = sorted(int(chunk_id) for chunk_id in manifest['completed'])
+    parts = [np.load(os.path.join(output_dir, f"part-{chunk_id:05d}.npz")) for chunk_id in chunk_ids]
+    columns = {name: np.concatenate([part[name] for part in parts]) for name in parts[0].files} if parts else {}
+    columns['classes'] = np.array(manifest['classes'])
+    return columns
+
+
+def run_bulk_scoring(input_path, output_dir, model_path='model.pkl', chunk_size=100000, workers=None,
+                     top_k=1, columns=None, use_lut=False):
+    """Score every row of input_path, skipping chunks already written by an earlier run"""
+    import joblib
+
+    if top_k < 1:
+        raise ValueError(f"top_k must be at least 1, got {top_k}")
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be at least 1, got {chunk_size}")
+
+    workers = workers or os.cpu_count() or 1
+    schema = load_schema_for(model_path)
+    columns = columns or (LEGACY_FEATURES if input_path.endswith('.npy') else schema.features)
+    check_columns(input_path, columns, schema)
+    os.makedirs(output_dir, exist_ok=True)
+
+    settings = {
+        'input': os.path.abspath(input_path),
+        'input_size': os.path.getsize(input_path),
+        'model': os.path.abspath(model_path),
+        'chunk_size': chunk_size,
+        'top_k': top_k,
+        'columns': columns,
+        'use_lut': use_lut,
+        'format': PART_FORMAT
+    }
+    completed, invalid = load_manifest(output_dir, settings)
+    classes = load_recommender(joblib.load(model_path), schema, model_path).classes
+    if completed:
+        print(f"🔁 Resuming: {len(completed)} chunks already scored")
+
+    print(f"🚀 Scoring {input_path} with {workers} workers (chunk size {chunk_size})")
+    start_time = time.time()
+    scored_rows = 0
+    in_flight = {}
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(model_path, use_lut)) as executor:
+
+        def collect(return_when):
+            nonlocal scored_rows
+            done, _ = wait(in_flight, return_when=return_when)
+            for future in done:
+                in_flight.pop(future)
+                chunk_id, rows, invalid_rows = future.result()
+                completed[chunk_id] = rows
+                invalid[chunk_id] = invalid_rows
+                scored_rows += rows
+            save_manifest(output_dir, settings, classes, completed, invalid)
+            elapsed = time.time() - start_time
+            print(f"  ✅ {len(completed)} chunks done, {scored_rows / max(elapsed, 1e-9):,.0f} rows/sec")
+
+        for chunk_id, chunk_columns, values, source in iter_chunks(input_path, chunk_size, columns):
+            if chunk_id in completed:
+                continue
+            # Bound the number of chunks held in memory at once
+            if len(in_flight) >= workers * 2:
+                collect(FIRST_COMPLETED)
+            future = executor.submit(score_chunk, chunk_id, chunk_columns, values, source, top_k, output_dir)
+            in_flight[future] = chunk_id
+
+        while in_flight:
+            collect(FIRST_COMPLETED)
+
+    save_manifest(output_dir, settings, classes, completed, invalid, finished=True)
+    total_rows = sum(completed.values())
+    invalid_rows = sum(invalid.values())
+
+    elapsed = time.time() - start_time
+    print("=" * 60)
+    print(f"✅ Scored {scored_rows:,} rows in {elapsed:.2f}s ({scored_rows / max(elapsed, 1e-9):,.0f} rows/sec)")
+    print(f"📦 {total_rows:,} rows in {len(completed)} part files under {output_dir}")
+    if invalid_rows:
+        print(f"⚠️  {invalid_rows:,} rows failed validation (blank required, non-numeric or out-of-range "
+              "values); they are marked valid=False and were not scored")
+    print("=" * 60)
+    return scored_rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk crop recommendations for gridded weather/soil data")
+    parser.add_argument('input', help="CSV with feature columns, or a 2-D .npy file (memory-mapped)")
+    parser.add_argument('output', help="output directory for columnar part files and manifest.json")
+    parser.add_argument('--model', default='model.pkl', help="trained model (schema and recommender are read next to it)")
+    parser.add_argument('--chunk-size', type=int, default=100000, help="rows per chunk")
+    parser.add_argument('--workers', type=int, help="worker processes (default: all cores)")
+    parser.add_argument('--top-k', type=int, default=1, help="number of ranked crops to store per cell")
+    parser.add_argument('--columns', help="comma separated column order of a .npy input "
+                                          f"(default: {','.join(LEGACY_FEATURES)})")
+    parser.add_argument('--use-lut', action='store_true', help="answer in-range cells from the recommender lookup table")
+    args = parser.parse_args()
+
+    try:
+        run_bulk_scoring(args.input, args.output, model_path=args.model, chunk_size=args.chunk_size,
+                         workers=args.workers, top_k=args.top_k,
+                         columns=args.columns.split(',') if args.columns else None, use_lut=args.use_lut)
+    except (OSError, ValueError) as e:
+        print(f"❌ Bulk scoring failed: {str(e)}")
+        sys.exit(1)
@@ -1,6 +1,36 @@
 # Configuration for Farmer Guider AI
 # Only essential configurations are kept
 
+import os
+
+
 class Config:
     # Flask basic configuration (if needed for future features)
-    pass
+
+    # Request profiling (disabled unless FARMHELP_PROFILE_DIR is set)
+    PROFILE_DIR = os.environ.get('FARMHELP_PROFILE_DIR')
+    PROFILE_SAMPLE_RATE = float(os.environ.get('FARMHELP_PROFILE_SAMPLE_RATE', '0'))
+    PROFILE_MAX_PER_MINUTE = int(os.environ.get('FARMHELP_PROFILE_MAX_PER_MINUTE', '6'))
+    # On-demand profiling needs this shared token in the X-Profile header; unset disables it
+    PROFILE_TOKEN = os.environ.get('FARMHELP_PROFILE_TOKEN') or None
+
+    # Startup: model path, preload-then-fork mode and readiness waiting
+    MODEL_PATH = os.environ.get('FARMHELP_MODEL_PATH', 'model.pkl')
+    PRELOAD = os.environ.get('FARMHELP_PRELOAD', '0') == '1'
+    PRELOAD_KNOWLEDGE = os.environ.get('FARMHELP_PRELOAD_KNOWLEDGE', '0') == '1'
+    MODEL_WAIT_SECONDS = float(os.environ.get('FARMHELP_MODEL_WAIT_SECONDS', '30'))
+
+    # Top-k recommendations (/api/recommend)
+    RECOMMEND_TOP_K = int(os.environ.get('FARMHELP_RECOMMEND_TOP_K', '3'))
+    RECOMMEND_MAX_K = int(os.environ.get('FARMHELP_RECOMMEND_MAX_K', '10'))
+    RECOMMEND_USE_LUT = os.environ.get('FARMHELP_RECOMMEND_USE_LUT', '0') == '1'
+
+    # Input validation: body size limit (bytes) and batch cap for /api/predict
+    MAX_CONTENT_LENGTH = int(os.environ.get('FARMHELP_MAX_CONTENT_LENGTH', str(256 * 1024)))
+    MAX_BATCH_SIZE = int(os.environ.get('FARMHELP_MAX_BATCH_SIZE', '1000'))
+
+    # Drift monitoring: live input/label sketches compared against drift_reference.npz
+    MONITOR_ENABLED = os.environ.get('FARMHELP_MONITOR_ENABLED', '1') == '1'
+    MONITOR_DIR = os.environ.get('FARMHELP_MONITOR_DIR')
+    MONITOR_SNAPSHOT_SECONDS = float(os.environ.get('FARMHELP_MONITOR_SNAPSHOT_SECONDS', '300'))
+    MONITOR_MIN_ROWS = int(os.environ.get('FARMHELP_MONITOR_MIN_ROWS', '200'))
@@ -14,9 +14,11 @@ from urllib.parse import urljoin, urlparse
 import pandas as pd
 from datetime import datetime
 import os
+import argparse
+from profiling import StageProfiler
 
 class AgricultureDataCollector:
-    def __init__(self):
+    def __init__(self, profiler=None):
         self.sources = {
             'wikipedia': [
                 'https://en.wikipedia.org/wiki/Agriculture',
@@ -42,6 +44,7 @@ class AgricultureDataCollector:
         }
 
         self.collected_data = []
+        self.profiler = profiler or StageProfiler()
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
@@ -245,12 +248,16 @@ class AgricultureDataCollector:
         start_time = time.time()
 
         # Collect data from all sources
-        self.scrape_wikipedia_pages()
-        self.scrape_news_sites()
-        self.scrape_rss_feeds()
+        with self.profiler.stage('scrape_wikipedia'):
+            self.scrape_wikipedia_pages()
+        with self.profiler.stage('scrape_news'):
+            self.scrape_news_sites()
+        with self.profiler.stage('scrape_rss'):
+            self.scrape_rss_feeds()
 
         # Save collected data
-        self.save_data()
+        with self.profiler.stage('save_data'):
+            self.save_data()
 
         end_time = time.time()
         duration = end_time - start_time
@@ -263,5 +270,11 @@ class AgricultureDataCollector:
         return self.collected_data
 
 if __name__ == "__main__":
-    collector = AgricultureDataCollector()
+    parser = argparse.ArgumentParser(description="Collect agriculture articles for Nax AI training")
+    parser.add_argument('--profile', metavar='DIR', help="write per-stage cProfile dumps and peak memory to DIR")
+    args = parser.parse_args()
+
+    profiler = StageProfiler(args.profile)
+    collector = AgricultureDataCollector(profiler=profiler)
     data = collector.run_collection()
+    profiler.write_summary()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Feature Schema for the Crop Prediction Model
+Fixed, versioned description of the model inputs shared by training and serving
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+
+SCHEMA_VERSION = 2
+
+# Column order is the order the model was trained on
+FEATURES = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+REQUIRED_FEATURES = ['temperature', 'humidity', 'ph', 'rainfall']
+LEGACY_FEATURES = ['temperature', 'humidity', 'ph', 'rainfall']
+
+# Rows missing any optional feature are scored by a model trained on these alone
+FALLBACK_FEATURES = ['temperature', 'humidity', 'ph', 'rainfall']
+FALLBACK_MODEL = 'model_fallback.pkl'
+
+# Physically plausible input ranges; values outside are rejected before model work
+FEATURE_RANGES = {
+    'N': (0.0, 500.0),
+    'P': (0.0, 500.0),
+    'K': (0.0, 500.0),
+    'temperature': (-50.0, 60.0),
+    'humidity': (0.0, 100.0),
+    'ph': (0.0, 14.0),
+    'rainfall': (0.0, 5000.0)
+}
+
+# Alternative form/JSON field names accepted for a feature, in lookup order
+FIELD_ALIASES = {
+    'N': ['N', 'nitrogen'],
+    'P': ['P', 'phosphorus'],
+    'K': ['K', 'potassium'],
+    'temperature': ['temperature', 'temperatureManual'],
+    'humidity': ['humidity', 'humidityManual'],
+    'ph': ['ph'],
+    'rainfall': ['rainfall']
+}
+
+
+class FeatureValueError(ValueError):
+    """Invalid feature input, with a machine-readable code and the offending field/rows"""
+
+    def __init__(self, code, message, field=None, rows=None):
+        super().__init__(message)
+        self.code = code
+        self.field = field
+        self.rows = rows
+
+
+def _is_blank(value):
+    """Missing and empty-string values both count as not provided"""
+    return value is None or (isinstance(value, str) and value == '')
+
+
+class FeatureSchema:
+    """Ordered model features with required flags and imputation defaults
+
+    Since version 2 a schema can name a fallback model (``fallback_model``,
+    stored next to the main model) trained on ``fallback_features`` only.
+    Rows that leave any optional feature blank are routed to it instead of
+    being imputed, since the main model never saw imputed optional values.
+    """
+
+    def __init__(self, features, required, defaults, version=SCHEMA_VERSION, created_at=None,
+                 fallback_features=None, fallback_model=None):
+        self.features = list(features)
+        self.required = [name for name in self.features if name in set(required)]
+        self.version = version
+        self.created_at = created_at
+        self.fallback_features = list(fallback_features) if fallback_features else None
+        self.fallback_model = fallback_model if fallback_features else None
+
+        self.index = {name: i for i, name in enumerate(self.features)}
+        self.defaults = np.array([defaults[name] for name in self.features], dtype=np.float32)
+        self._required_mask = np.array([name in set(required) for name in self.features])
+        self.optional_columns = np.flatnonzero(~self._required_mask)
+        self.fallback_columns = (np.array([self.index[name] for name in self.fallback_features], dtype=np.intp)
+                                 if self.fallback_features else None)
+        self.low = np.array([FEATURE_RANGES.get(name, (-np.inf, np.inf))[0] for name in self.features], dtype=np.float32)
+        self.high = np.array([FEATURE_RANGES.get(name, (-np.inf, np.inf))[1] for name in self.features], dtype=np.float32)
+        self._local = threading.local()
+
+    @property
+    def n_features(self):
+        return len(self.features)
+
+    @classmethod
+    def from_frame(cls, data, features=FEATURES, required=REQUIRED_FEATURES, fallback_features=None):
+        """Build a schema from training data, using column medians as imputation defaults"""
+        defaults = {}
+        for name in features:
+            median = data[name].median() if name in data else np.nan
+            defaults[name] = float(median) if not np.isnan(median) else 0.0
+        return cls(features, required, defaults, created_at=datetime.now().isoformat(),
+                   fallback_features=fallback_features, fallback_model=FALLBACK_MODEL if fallback_features else None)
+
+    @classmethod
+    def legacy(cls):
+        """Schema matching models trained before NPK support (four weather features)"""
+        return cls(LEGACY_FEATURES, LEGACY_FEATURES, {name: 0.0 for name in LEGACY_FEATURES}, version=0)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+        if payload.get('version', 0) > SCHEMA_VERSION:
+            raise ValueError(f"Feature schema version {payload['version']} is newer than supported {SCHEMA_VERSION}")
+        return cls(payload['features'], payload['required'], payload['defaults'],
+                   version=payload['version'], created_at=payload.get('created_at'),
+                   fallback_features=payload.get('fallback_features'), fallback_model=payload.get('fallback_model'))
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def to_dict(self):
+        return {
+            'version': self.version,
+            'created_at': self.created_at,
+            'dtype': 'float32',
+            'features': self.features,
+            'required': self.required,
+            'defaults': {name: float(value) for name, value in zip(self.features, self.defaults)},
+            'fallback_features': self.fallback_features,
+            'fallback_model': self.fallback_model
+        }
+
+    def incomplete_rows(self, X):
+        """Boolean mask of rows that leave any optional feature blank (NaN)"""
+        return np.isnan(X[:, self.optional_columns]).any(axis=1)
+
+    def impute(self, X):
+        """Replace missing (NaN) values with the schema defaults, in place"""
+        missing = np.isnan(X)
+        if missing.any():
+            np.copyto(X, np.broadcast_to(self.defaults, X.shape), where=missing)
+        return X
+
+    def transform_frame(self, data, impute=True):
+        """Turn a DataFrame into a contiguous float32 matrix in schema order"""
+        X = np.empty((len(data), self.n_features), dtype=np.float32)
+        for i, name in enumerate(self.features):
+            if name in data:
+                X[:, i] = data[name].to_numpy(dtype=np.float32, na_value=np.nan)
+            else:
+                X[:, i] = np.nan
+        return self.impute(X) if impute else X
+
+    def row_buffer(self):
+        """Per-thread preallocated (1, n_features) float32 buffer"""
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None:
+            buffer = np.empty((1, self.n_features), dtype=np.float32)
+            self._local.buffer = buffer
+        return buffer
+
+    def row_from_mapping(self, mapping, impute=True):
+        """Fill the thread's row buffer from a form or JSON mapping
+
+        Missing optional features are imputed; a missing required feature, a
+        non-numeric value or a value outside FEATURE_RANGES raises
+        FeatureValueError. With ``impute=False`` missing values are left as NaN
+        for the caller to inspect and impute. The returned buffer is reused by
+        the next call on the same thread.
+        """
+        row = self.row_buffer()[0]
+        for i, name in enumerate(self.features):
+            value = None
+            for field in FIELD_ALIASES.get(name, [name]):
+                value = mapping.get(field)
+                if not _is_blank(value):
+                    break
+            if _is_blank(value):
+                row[i] = np.nan
+                continue
+            try:
+                if isinstance(value, bool):
+                    raise TypeError(name)
+                row[i] = float(value)
+            except (TypeError, ValueError, OverflowError):
+                raise FeatureValueError('invalid_value', f"Feature '{name}' must be a number", field=name)
+
+        self.check(row.reshape(1, -1))
+        if impute:
+            self.impute(row)
+        return row.reshape(1, -1)
+
+    def check(self, X):
+        """Reject missing required values and out-of-range values, column by column"""
+        missing = np.isnan(X) & self._required_mask
+        if missing.any():
+            column = int(np.flatnonzero(missing.any(axis=0))[0])
+            name = self.features[column]
+            raise FeatureValueError('missing_feature', f"Missing required feature '{name}'", field=name,
+                                    rows=np.flatnonzero(missing[:, column])[:10].tolist())
+
+        # NaN compares False on both sides, so only real (or infinite) values can fail
+        out_of_range = (X < self.low) | (X > self.high)
+        if out_of_range.any():
+            column = int(np.flatnonzero(out_of_range.any(axis=0))[0])
+            name = self.features[column]
+            raise FeatureValueError('out_of_range',
+                                    f"Feature '{name}' must be between {self.low[column]:g} and {self.high[column]:g}",
+                                    field=name, rows=np.flatnonzero(out_of_range[:, column])[:10].tolist())
+
+    def invalid_rows(self, X):
+        """Boolean mask of the rows check() would reject, for callers that flag rather than raise"""
+        return ((np.isnan(X) & self._required_mask) | (X < self.low) | (X > self.high)).any(axis=1)
+
+    def matrix_from_columns(self, columns, n_rows, impute=True):
+        """Build and validate a float32 batch matrix from per-feature value lists
+
+        Follows the row_from_mapping rules row by row: aliases are tried in
+        order for every row, and None or "" counts as missing.
+        """
+        X = np.empty((n_rows, self.n_features), dtype=np.float32)
+        for i, name in enumerate(self.features):
+            values = None
+            for field in FIELD_ALIASES.get(name, [name]):
+                column = columns.get(field)
+                if column is None:
+                    continue
+                if not isinstance(column, (list, tuple)) or len(column) != n_rows:
+                    raise FeatureValueError('invalid_value', f"Column '{name}' must be a list of {n_rows} numbers",
+                                            field=name)
+                if values is None:
+                    values = list(column)
+                else:
+                    values = [other if _is_blank(value) else value for value, other in zip(values, column)]
+            if values is None:
+                X[:, i] = np.nan
+                continue
+            try:
+                if any(isinstance(value, bool) for value in values):
+                    raise TypeError(name)
+                X[:, i] = np.array([np.nan if _is_blank(value) else value for value in values], dtype=np.float64)
+            except (TypeError, ValueError, OverflowError):
+                raise FeatureValueError('invalid_value', f"Column '{name}' must contain only numbers", field=name)
+
+        self.check(X)
+        return self.impute(X) if impute else X
+
+    def matrix_from_records(self, records, impute=True):
+        """Build and validate a float32 batch matrix from a list of feature mappings"""
+        if not all(isinstance(record, dict) for record in records):
+            raise FeatureValueError('invalid_value', "Every instance must be a JSON object")
+
+        fields = {field for aliases in FIELD_ALIASES.values() for field in aliases} | set(self.features)
+        present = {field for record in records for field in record if field in fields}
+        columns = {field: [record.get(field) for record in records] for field in present}
+        return self.matrix_from_columns(columns, len(records), impute=impute)
+
+
+def schema_path_for(model_path):
+    """Location of the schema file written next to a model file"""
+    return os.path.join(os.path.dirname(os.path.abspath(model_path)), 'feature_schema.json')
+
+
+def fallback_path_for(model_path, schema):
+    """Location of the schema's fallback model next to a model file, or None if it has none"""
+    if not schema.fallback_model:
+        return None
+    return os.path.join(os.path.dirname(os.path.abspath(model_path)), schema.fallback_model)
+
+
+def load_schema_for(model_path):
+    """Load the schema saved next to a model, falling back to the legacy four-feature schema"""
+    path = schema_path_for(model_path)
+    if os.path.exists(path):
+        return FeatureSchema.load(path)
+    return FeatureSchema.legacy()
@@ -0,0 +1,21 @@
+# Gunicorn configuration for Farmer Guider AI (Linux deployments)
+# Usage: gunicorn app:app
+
+import os
+
+# Load the model once in the master, then fork workers that share its pages
+# copy-on-write instead of each unpickling their own copy.
+preload_app = True
+os.environ.setdefault('FARMHELP_PRELOAD', '1')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+
+
+def post_fork(server, worker):
+    # Chroma's client and torch are not fork-safe, so the knowledge processor is
+    # never preloaded in the master; each worker loads its own after the fork
+    from app import app, load_knowledge_in_background
+
+    if app.config['PRELOAD_KNOWLEDGE']:
+        load_knowledge_in_background()
@@ -13,14 +13,84 @@ from chromadb.config import Settings
 import pandas as pd
 from datetime import datetime
 import re
+import sys
+import time
+import argparse
 from typing import List, Dict, Any
+from profiling import StageProfiler
+from retrieval import chunk_id, collapse_by_url, expand_neighbours, mmr_select
+
+# Crops tagged on every chunk as boolean metadata (crop_<name>) so searches can filter by crop
+CROP_KEYWORDS = [
+    'apple', 'banana', 'barley', 'blackgram', 'chickpea', 'coconut', 'coffee', 'cotton', 'grapes',
+    'groundnut', 'jute', 'kidneybeans', 'lentil', 'maize', 'mango', 'millet', 'mothbeans', 'mungbean',
+    'muskmelon', 'mustard', 'orange', 'papaya', 'pigeonpeas', 'pomegranate', 'potato', 'rice',
+    'sorghum', 'soybean', 'sugarcane', 'tea', 'watermelon', 'wheat'
+]
+CROP_PATTERN = re.compile(r'\b(' + '|'.join(CROP_KEYWORDS) + r')s?\b', re.IGNORECASE)
+
+def to_timestamp(value) -> int:
+    """Seconds since the epoch for a datetime, ISO string or number"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return int(value.timestamp())
+
+def iter_json_records(path: str, block_size: int = 1 << 20):
+    """Yield the objects of a JSON array (or JSON Lines) file one at a time
+
+    The file is read in ``block_size`` pieces and each element is decoded with
+    ``JSONDecoder.raw_decode`` as soon as it is complete, so memory holds one
+    block plus the element being decoded, however large the file is.
+    """
+    decoder = json.JSONDecoder()
+    whitespace = re.compile(r'[\s,]*')
+
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = f.read(block_size)
+        position = whitespace.match(buffer).end()
+        in_array = buffer[position:position + 1] == '['
+        if in_array:
+            position += 1
+        eof = not buffer
+
+        while True:
+            position = whitespace.match(buffer, position).end()
+            if in_array and buffer[position:position + 1] == ']':
+                return
+
+            if position < len(buffer):
+                try:
+                    record, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    end = None
+                # A value ending exactly at the end of the buffer may continue in the next block
+                if end is not None and (end < len(buffer) or eof):
+                    yield record
+                    position = end
+                    continue
+            elif eof:
+                return
+
+            # Drop what has been consumed and read the next block
+            block = f.read(block_size)
+            eof = not block
+            buffer = buffer[position:] + block
+            position = 0
 
 class AgricultureKnowledgeProcessor:
-    def __init__(self, model_name='all-MiniLM-L6-v2'):
+    def __init__(self, model_name='all-MiniLM-L6-v2', profiler=None,
+                 persist_directory="./chroma_db", collection_name="agriculture_knowledge"):
         self.model_name = model_name
+        self.persist_directory = persist_directory
+        self.collection_name = collection_name
         self.embedding_model = None
         self.chroma_client = None
         self.collection = None
+        self.profiler = profiler or StageProfiler()
 
         # Initialize ChromaDB
         self.setup_chromadb()
@@ -28,17 +98,21 @@ class AgricultureKnowledgeProcessor:
     def setup_chromadb(self):
         """Initialize ChromaDB client and collection"""
         try:
-            # Try persistent client first
-            try:
-                self.chroma_client = chromadb.PersistentClient(path="./chroma_db")
-                print("💾 Using persistent ChromaDB storage")
-            except Exception as disk_error:
-                print(f"⚠️  Disk storage failed ({str(disk_error)}), using in-memory storage")
+            if self.persist_directory is None:
                 self.chroma_client = chromadb.Client()
                 print("🧠 Using in-memory ChromaDB storage")
+            else:
+                # Try persistent client first
+                try:
+                    self.chroma_client = chromadb.PersistentClient(path=self.persist_directory)
+                    print("💾 Using persistent ChromaDB storage")
+                except Exception as disk_error:
+                    print(f"⚠️  Disk storage failed ({str(disk_error)}), using in-memory storage")
+                    self.chroma_client = chromadb.Client()
+                    print("🧠 Using in-memory ChromaDB storage")
 
             # Create or get collection
-            collection_name = "agriculture_knowledge"
+            collection_name = self.collection_name
             try:
                 self.collection = self.chroma_client.get_collection(name=collection_name)
                 print("📚 Using existing knowledge collection")
@@ -94,13 +168,19 @@ class AgricultureKnowledgeProcessor:
             chunk = ' '.join(words[start:end])
             chunks.append(chunk)
 
+            # Stop once the last word is covered, otherwise the overlap never advances
+            if end >= len(words):
+                break
+
             # Move start position with overlap
             start = end - overlap
-            if start >= len(words):
-                break
 
         return chunks
 
+    def crop_flags(self, text: str) -> Dict[str, bool]:
+        """Metadata flags for the crops a chunk mentions, e.g. {'crop_rice': True}"""
+        return {f"crop_{match.lower()}": True for match in set(CROP_PATTERN.findall(text))}
+
     def process_article(self, article: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Process a single article into chunks with metadata"""
         title = article.get('title', 'Unknown Title')
@@ -108,6 +188,7 @@ class AgricultureKnowledgeProcessor:
         url = article.get('url', '')
         source = article.get('source', 'Unknown')
         category = article.get('category', 'General')
+        scraped_at = article.get('scraped_at', '')
 
         # Preprocess content
         processed_content = self.preprocess_text(content)
@@ -122,91 +203,253 @@ class AgricultureKnowledgeProcessor:
         chunk_docs = []
         for i, chunk in enumerate(chunks):
             chunk_doc = {
-                'id': f"{url}_{i}",
+                'id': chunk_id(url, i),
                 'content': chunk,
                 'title': title,
                 'url': url,
                 'source': source,
                 'category': category,
                 'chunk_index': i,
-                'total_chunks': len(chunks)
+                'total_chunks': len(chunks),
+                'scraped_at': scraped_at
             }
             chunk_docs.append(chunk_doc)
 
         return chunk_docs
 
-    def add_to_knowledge_base(self, articles: List[Dict[str, Any]]):
-        """Add articles to the knowledge base with embeddings"""
+    def add_to_knowledge_base(self, articles: List[Dict[str, Any]]) -> bool:
+        """Add articles to the knowledge base with embeddings; returns False if any batch failed"""
         print(f"🧠 Processing {len(articles)} articles for knowledge base...")
 
-        self.load_embedding_model()
+        with self.profiler.stage('load_embedding_model'):
+            self.load_embedding_model()
 
         all_chunks = []
         ids = []
         metadatas = []
         contents = []
 
-        for article in articles:
-            chunks = self.process_article(article)
-            all_chunks.extend(chunks)
+        with self.profiler.stage('chunk_articles'):
+            for article in articles:
+                chunks = self.process_article(article)
+                all_chunks.extend(chunks)
 
         print(f"📝 Generated {len(all_chunks)} text chunks")
 
-        # Process in batches to avoid memory issues
-        batch_size = 100
-        for i in range(0, len(all_chunks), batch_size):
-            batch = all_chunks[i:i + batch_size]
-            batch_contents = [chunk['content'] for chunk in batch]
-            batch_ids = [chunk['id'] for chunk in batch]
-
-            # Create embeddings
-            try:
-                embeddings = self.embedding_model.encode(batch_contents, show_progress_bar=True)
-                embeddings_list = embeddings.tolist()
-
-                # Prepare metadata
-                batch_metadatas = []
-                for chunk in batch:
-                    metadata = {
-                        'title': chunk['title'],
-                        'url': chunk['url'],
-                        'source': chunk['source'],
-                        'category': chunk['category'],
-                        'chunk_index': str(chunk['chunk_index']),
-                        'total_chunks': str(chunk['total_chunks'])
-                    }
-                    batch_metadatas.append(metadata)
+        stored = 0
+        failed_batches = 0
+        with self.profiler.stage('embed_and_store'):
+            # Process in batches to avoid memory issues
+            batch_size = 100
+            for i in range(0, len(all_chunks), batch_size):
+                batch = all_chunks[i:i + batch_size]
+                try:
+                    self.store_chunks(batch)
+                    stored += len(batch)
+                    print(f"✅ Added batch {i//batch_size + 1}/{(len(all_chunks) + batch_size - 1)//batch_size}")
+
+                except Exception as e:
+                    failed_batches += 1
+                    print(f"❌ Error processing batch {i//batch_size + 1}: {str(e)}")
+                    continue
+
+        if failed_batches:
+            print(f"❌ {failed_batches} batches failed; stored {stored} of {len(all_chunks)} chunks")
+            return False
+        print(f"🎉 Successfully added {stored} chunks to knowledge base")
+        return True
+
+    def chunk_metadata(self, chunk: Dict[str, Any]) -> Dict[str, Any]:
+        """Metadata stored with a chunk: article fields, scrape time and crop flags"""
+        metadata = {
+            'title': chunk['title'],
+            'url': chunk['url'],
+            'source': chunk['source'],
+            'category': chunk['category'],
+            'chunk_index': chunk['chunk_index'],
+            'total_chunks': chunk['total_chunks'],
+            'scraped_at': chunk['scraped_at']
+        }
+        if chunk['scraped_at']:
+            # Numeric copy so date ranges can use $gte/$lt filters
+            metadata['scraped_ts'] = to_timestamp(chunk['scraped_at'])
+        metadata.update(self.crop_flags(chunk['content']))
+        return metadata
+
+    def store_chunks(self, batch: List[Dict[str, Any]], show_progress_bar: bool = True):
+        """Embed a batch of chunk documents and upsert them into the collection"""
+        contents = [chunk['content'] for chunk in batch]
+        embeddings = self.embedding_model.encode(contents, show_progress_bar=show_progress_bar)
+        self.collection.upsert(
+            embeddings=embeddings.tolist(),
+            documents=contents,
+            metadatas=[self.chunk_metadata(chunk) for chunk in batch],
+            ids=[chunk['id'] for chunk in batch]
+        )
+
+    def iter_chunks(self, articles, start_article: int = 0, start_chunk: int = 0):
+        """Lazily chunk articles, yielding (article_index, chunk) from a resume position on"""
+        for article_index, article in enumerate(articles):
+            if article_index < start_article:
+                continue
+            for chunk in self.process_article(article):
+                if article_index == start_article and chunk['chunk_index'] < start_chunk:
+                    continue
+                yield article_index, chunk
+
+    def checkpoint_path(self, data_file: str) -> str:
+        return f"{data_file}.{self.collection_name}.checkpoint.json"
+
+    def load_checkpoint(self, data_file: str) -> Dict[str, Any]:
+        """Resume position of an interrupted streaming ingest of data_file, if it still applies"""
+        path = self.checkpoint_path(data_file)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+
+        stat = os.stat(data_file)
+        if (checkpoint.get('size'), checkpoint.get('mtime'), checkpoint.get('model_name')) != \
+                (stat.st_size, stat.st_mtime, self.model_name):
+            print(f"⚠️  Ignoring {path}: {data_file} or the embedding model changed since it was written")
+            return None
+        return checkpoint
+
+    def save_checkpoint(self, data_file: str, article_index: int, chunk_index: int, chunks_committed: int):
+        stat = os.stat(data_file)
+        path = self.checkpoint_path(data_file)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({
+                'data_file': os.path.abspath(data_file),
+                'size': stat.st_size,
+                'mtime': stat.st_mtime,
+                'model_name': self.model_name,
+                'article_index': article_index,
+                'chunk_index': chunk_index,
+                'chunks_committed': chunks_committed,
+                'updated_at': datetime.now().isoformat()
+            }, f, indent=2)
+        os.replace(path + '.tmp', path)
+
+    def stream_to_knowledge_base(self, data_file: str, batch_size: int = 100, checkpoint: bool = True) -> bool:
+        """Ingest a large article dump with memory bounded by one batch
+
+        Articles are parsed incrementally, chunked lazily and flushed every
+        ``batch_size`` chunks. After each flushed batch the position of its
+        last chunk is checkpointed, so a rerun after a crash resumes from the
+        last committed batch. Returns False if a batch failed (rerun to resume).
+        """
+        start_article, start_chunk, committed = 0, 0, 0
+        saved = self.load_checkpoint(data_file) if checkpoint else None
+        if saved:
+            start_article, start_chunk, committed = saved['article_index'], saved['chunk_index'], saved['chunks_committed']
+            print(f"🔁 Resuming after {committed} chunks (article {start_article}, chunk {start_chunk})")
+
+        with self.profiler.stage('load_embedding_model'):
+            self.load_embedding_model()
 
-                # Add to collection
-                self.collection.add(
-                    embeddings=embeddings_list,
-                    documents=batch_contents,
-                    metadatas=batch_metadatas,
-                    ids=batch_ids
-                )
+        start_time = time.time()
+        batch = []
+        position = None
 
-                print(f"✅ Added batch {i//batch_size + 1}/{(len(all_chunks) + batch_size - 1)//batch_size}")
+        def flush():
+            nonlocal committed
+            self.store_chunks(batch, show_progress_bar=False)
+            committed += len(batch)
+            if checkpoint:
+                self.save_checkpoint(data_file, position[0], position[1] + 1, committed)
+            print(f"✅ {committed} chunks committed ({committed / max(time.time() - start_time, 1e-9):.1f} chunks/sec)")
+            batch.clear()
 
+        with self.profiler.stage('stream_ingest'):
+            try:
+                for article_index, chunk in self.iter_chunks(iter_json_records(data_file), start_article, start_chunk):
+                    batch.append(chunk)
+                    position = (article_index, chunk['chunk_index'])
+                    if len(batch) >= batch_size:
+                        flush()
+                if batch:
+                    flush()
             except Exception as e:
-                print(f"❌ Error processing batch {i//batch_size + 1}: {str(e)}")
+                print(f"❌ Streaming ingest stopped after {committed} chunks: {str(e)}")
+                print("   Rerun the same command to resume from the last committed batch")
+                return False
+
+        if checkpoint and os.path.exists(self.checkpoint_path(data_file)):
+            os.remove(self.checkpoint_path(data_file))
+        print(f"🎉 Successfully streamed {committed} chunks into the knowledge base")
+        return True
+
+    @staticmethod
+    def build_filter(category=None, source=None, crop=None, scraped_after=None,
+                     scraped_before=None) -> Dict[str, Any]:
+        """Chroma ``where`` clause for the given filters, or None when there are none
+
+        ``category``, ``source`` and ``crop`` accept one value or a list (any of);
+        ``scraped_after``/``scraped_before`` accept datetimes, ISO strings or epoch
+        seconds and bound the scrape date as [after, before).
+        """
+        conditions = []
+        for field, value in (('category', category), ('source', source)):
+            if value is None:
                 continue
+            if isinstance(value, (list, tuple, set)):
+                conditions.append({field: {'$in': list(value)}})
+            else:
+                conditions.append({field: value})
+
+        if crop:
+            crops = [crop] if isinstance(crop, str) else list(crop)
+            flags = [{f"crop_{name.lower()}": True} for name in crops]
+            conditions.append(flags[0] if len(flags) == 1 else {'$or': flags})
+
+        if scraped_after is not None:
+            conditions.append({'scraped_ts': {'$gte': to_timestamp(scraped_after)}})
+        if scraped_before is not None:
+            conditions.append({'scraped_ts': {'$lt': to_timestamp(scraped_before)}})
+
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else {'$and': conditions}
+
+    def search_knowledge_base(self, query: str, n_results: int = 5, category=None, source=None,
+                              crop=None, scraped_after=None, scraped_before=None, collapse: bool = False,
+                              neighbours: int = 0, diversity: float = None,
+                              fetch_k: int = None) -> List[Dict[str, Any]]:
+        """Search the knowledge base for relevant information
+
+        Filters are applied by the vector store during the nearest-neighbour
+        search (against its metadata index), so ``n_results`` matching chunks
+        come back without over-fetching.
+
+        Post-processing (all off by default): ``collapse`` keeps one hit per
+        article URL, stitching adjacent overlapping hits into it; ``diversity``
+        (0.0-1.0) reranks with maximal marginal relevance; ``neighbours`` stitches
+        that many surrounding chunks around each result. Collapsing and
+        diversifying pick from ``fetch_k`` candidates (default 4 x n_results).
+        A malformed ``scraped_after``/``scraped_before`` raises ValueError.
+        """
+        # Built outside the try below so invalid filter arguments reach the caller
+        where = self.build_filter(category, source, crop, scraped_after, scraped_before)
 
-        print(f"🎉 Successfully added {len(all_chunks)} chunks to knowledge base")
-
-    def search_knowledge_base(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
-        """Search the knowledge base for relevant information"""
         if not self.embedding_model:
             self.load_embedding_model()
 
         try:
             # Create query embedding
-            query_embedding = self.embedding_model.encode([query])[0].tolist()
+            query_embedding = self.embedding_model.encode([query])[0]
+
+            postprocess = collapse or diversity is not None
+            include = ['documents', 'metadatas', 'distances']
+            if diversity is not None:
+                include.append('embeddings')
 
             # Search collection
             results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=n_results,
-                include=['documents', 'metadatas', 'distances']
+                query_embeddings=[query_embedding.tolist()],
+                n_results=max(fetch_k or n_results * 4, n_results) if postprocess else n_results,
+                where=where,
+                include=include
             )
 
             # Format results
@@ -222,37 +465,73 @@ class AgricultureKnowledgeProcessor:
                         'url': metadata.get('url', ''),
                         'source': metadata.get('source', 'Unknown'),
                         'category': metadata.get('category', 'General'),
+                        'chunk_index': int(metadata.get('chunk_index', 0)),
+                        'total_chunks': int(metadata.get('total_chunks', 0)),
+                        'scraped_at': metadata.get('scraped_at', ''),
                         'relevance_score': 1 - distance  # Convert distance to similarity score
                     }
                     formatted_results.append(result)
 
+            kept = collapse_by_url(formatted_results) if collapse else list(range(len(formatted_results)))
+
+            if diversity is not None and kept:
+                embeddings = np.asarray(results['embeddings'][0], dtype=np.float32)[kept]
+                kept = [kept[i] for i in mmr_select(query_embedding, embeddings, n_results, diversity)]
+
+            formatted_results = [formatted_results[i] for i in kept[:n_results]]
+
+            if neighbours > 0:
+                expand_neighbours(self.collection, formatted_results, neighbours)
+
             return formatted_results
 
         except Exception as e:
             print(f"❌ Error searching knowledge base: {str(e)}")
             return []
 
-    def load_and_process_data(self, data_file: str = 'agriculture_knowledge_base.json'):
-        """Load collected data and process it into the knowledge base"""
+    def load_and_process_data(self, data_file: str = 'agriculture_knowledge_base.json', stream: bool = False,
+                              batch_size: int = 100):
+        """Load collected data and process it into the knowledge base
+
+        With ``stream=True`` the file is ingested incrementally with bounded
+        memory and checkpoints (see stream_to_knowledge_base). Returns False
+        if the data file is missing or any batch failed to store.
+        """
         if not os.path.exists(data_file):
             print(f"❌ Data file {data_file} not found. Please run data_collector.py first.")
-            return
+            return False
+
+        if stream:
+            print(f"🌊 Streaming data from {data_file}")
+            return self.stream_to_knowledge_base(data_file, batch_size=batch_size)
 
         print(f"📖 Loading data from {data_file}")
 
         try:
-            with open(data_file, 'r', encoding='utf-8') as f:
-                articles = json.load(f)
+            with self.profiler.stage('load_json'):
+                with open(data_file, 'r', encoding='utf-8') as f:
+                    articles = json.load(f)
 
             print(f"📊 Loaded {len(articles)} articles")
 
             # Process and add to knowledge base
-            self.add_to_knowledge_base(articles)
+            return self.add_to_knowledge_base(articles)
 
         except Exception as e:
             print(f"❌ Error processing data file: {str(e)}")
             raise
 
+    def export_snapshot(self, output_dir: str) -> Dict[str, Any]:
+        """Export the collection as a portable snapshot (see knowledge_snapshot.py)"""
+        from knowledge_snapshot import export_snapshot
+        return export_snapshot(self.collection, output_dir, self.model_name)
+
+    def import_snapshot(self, snapshot_dir: str, verify: bool = True):
+        """Bulk-load a snapshot into this processor's collection without re-embedding"""
+        from knowledge_snapshot import import_snapshot
+        self.collection = import_snapshot(self.chroma_client, snapshot_dir, model_name=self.model_name,
+                                          collection_name=self.collection_name, verify=verify)
+
     def get_stats(self) -> Dict[str, Any]:
         """Get statistics about the knowledge base"""
         try:
@@ -266,15 +545,17 @@ class AgricultureKnowledgeProcessor:
             print(f"❌ Error getting stats: {str(e)}")
             return {}
 
-def main():
+def main(profile_dir=None, stream=False, batch_size=100):
     """Main function to run the knowledge processor"""
     print("🚀 Starting Agriculture Knowledge Processor")
     print("=" * 50)
 
-    processor = AgricultureKnowledgeProcessor()
+    profiler = StageProfiler(profile_dir)
+    processor = AgricultureKnowledgeProcessor(profiler=profiler)
 
     # Load and process data
-    processor.load_and_process_data()
+    success = processor.load_and_process_data(stream=stream, batch_size=batch_size)
+    profiler.write_summary()
 
     # Print stats
     stats = processor.get_stats()
@@ -283,7 +564,20 @@ def main():
     print(f"   Collection: {stats.get('collection_name', 'Unknown')}")
     print(f"   Model: {stats.get('model_name', 'Unknown')}")
 
+    if not success:
+        print("\n❌ Knowledge processing failed; rerun to resume" if stream else "\n❌ Knowledge processing failed")
+        return False
+
     print("\n✅ Knowledge processing completed!")
+    return True
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Build the agriculture knowledge base")
+    parser.add_argument('--profile', metavar='DIR', help="write per-stage cProfile dumps and peak memory to DIR")
+    parser.add_argument('--stream', action='store_true',
+                        help="ingest incrementally with bounded memory, resuming from the last checkpoint")
+    parser.add_argument('--batch-size', type=int, default=100, help="chunks embedded and stored per batch")
+    args = parser.parse_args()
+
+    success = main(profile_dir=args.profile, stream=args.stream, batch_size=args.batch_size)
+    sys.exit(0 if success else 1)
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Knowledge Base Snapshots for Nax AI
+Exports the processed knowledge base as a portable snapshot and bulk-loads it without re-embedding
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from pipeline import file_fingerprint
+
+SNAPSHOT_VERSION = 1
+MANIFEST = 'manifest.json'
+EMBEDDINGS = 'embeddings.npy'
+CHUNKS = 'chunks.jsonl'
+
+
+def export_snapshot(collection, output_dir, model_name, batch_size=5000):
+    """Write a collection's vectors, chunk texts and metadata to output_dir
+
+    Vectors go into one contiguous float32 ``embeddings.npy`` (row i belongs to
+    line i of ``chunks.jsonl``); both are written batch by batch so memory
+    stays bounded by ``batch_size``.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    count = collection.count()
+    embeddings_path = os.path.join(output_dir, EMBEDDINGS)
+    chunks_path = os.path.join(output_dir, CHUNKS)
+
+    start_time = time.time()
+    matrix = None
+    written = 0
+    with open(chunks_path, 'w', encoding='utf-8') as chunks_file:
+        for offset in range(0, count, batch_size):
+            batch = collection.get(limit=batch_size, offset=offset,
+                                   include=['embeddings', 'documents', 'metadatas'])
+            vectors = np.asarray(batch['embeddings'], dtype=np.float32)
+            if matrix is None:
+                matrix = np.lib.format.open_memmap(embeddings_path, mode='w+', dtype=np.float32,
+                                                   shape=(count, vectors.shape[1]))
+            matrix[written:written + len(vectors)] = vectors
+
+            for id_, document, metadata in zip(batch['ids'], batch['documents'], batch['metadatas']):
+                chunks_file.write(json.dumps({'id': id_, 'document': document, 'metadata': metadata},
+                                             ensure_ascii=False) + '\n')
+            written += len(vectors)
+            print(f"  ✅ Exported {written}/{count} chunks")
+
+    if matrix is None:
+        matrix = np.lib.format.open_memmap(embeddings_path, mode='w+', dtype=np.float32, shape=(0, 0))
+    dimension = matrix.shape[1]
+    matrix.flush()
+    del matrix
+
+    manifest = {
+        'version': SNAPSHOT_VERSION,
+        'created_at': datetime.now().isoformat(),
+        'model_name': model_name,
+        'collection_name': collection.name,
+        'collection_metadata': collection.metadata,
+        'count': written,
+        'dimension': dimension,
+        'dtype': 'float32',
+        'checksums': {
+            EMBEDDINGS: file_fingerprint(embeddings_path),
+            CHUNKS: file_fingerprint(chunks_path)
+        }
+    }
+    with open(os.path.join(output_dir, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"📦 Exported {written} chunks ({dimension}-d) to {output_dir} in {time.time() - start_time:.2f}s")
+    return manifest
+
+
+def load_manifest(snapshot_dir, verify=True):
+    """Read a snapshot manifest, optionally checking the file checksums"""
+    with open(os.path.join(snapshot_dir, MANIFEST), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('version', 0) > SNAPSHOT_VERSION:
+        raise ValueError(f"Snapshot version {manifest['version']} is newer than supported {SNAPSHOT_VERSION}")
+
+    if verify:
+        for name, expected in manifest['checksums'].items():
+            if file_fingerprint(os.path.join(snapshot_dir, name)) != expected:
+                raise ValueError(f"Checksum mismatch for {name} in {snapshot_dir}")
+    return manifest
+
+
+def iter_chunk_batches(snapshot_dir, batch_size):
+    """Yield (start_row, ids, documents, metadatas) batches from chunks.jsonl"""
+    ids, documents, metadatas = [], [], []
+    start = 0
+    with open(os.path.join(snapshot_dir, CHUNKS), 'r', encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            ids.append(record['id'])
+            documents.append(record['document'])
+            metadatas.append(record['metadata'])
+            if len(ids) == batch_size:
+                yield start, ids, documents, metadatas
+                start += len(ids)
+                ids, documents, metadatas = [], [], []
+    if ids:
+        yield start, ids, documents, metadatas
+
+
+def import_snapshot(client, snapshot_dir, model_name=None, collection_name=None, batch_size=5000, verify=True):
+    """Bulk-load a snapshot into a Chroma collection without running the encoder
+
+    Vectors are read from the memory-mapped embedding matrix and upserted, so
+    an interrupted import can simply be rerun.
+    """
+    manifest = load_manifest(snapshot_dir, verify=verify)
+    if model_name and manifest['model_name'] != model_name:
+        raise ValueError(f"Snapshot was embedded with {manifest['model_name']}, not {model_name}; "
+                         "queries would be encoded into a different vector space")
+
+    collection = client.get_or_create_collection(name=collection_name or manifest['collection_name'],
+                                                  metadata=manifest.get('collection_metadata'))
+    embeddings = np.load(os.path.join(snapshot_dir, EMBEDDINGS), mmap_mode='r')
+    if embeddings.shape[0] != manifest['count']:
+        raise ValueError(f"{EMBEDDINGS} has {embeddings.shape[0]} rows but the manifest lists {manifest['count']}")
+
+    batch_size = min(batch_size, client.get_max_batch_size())
+    start_time = time.time()
+    loaded = 0
+    for start, ids, documents, metadatas in iter_chunk_batches(snapshot_dir, batch_size):
+        collection.upsert(ids=ids, embeddings=np.asarray(embeddings[start:start + len(ids)]),
+                          documents=documents, metadatas=metadatas)
+        loaded += len(ids)
+        print(f"  ✅ Loaded {loaded}/{manifest['count']} chunks")
+
+    elapsed = time.time() - start_time
+    print(f"📥 Imported {loaded} chunks into '{collection.name}' in {elapsed:.2f}s "
+          f"({loaded / max(elapsed, 1e-9):,.0f} chunks/sec)")
+    return collection
+
+
+class SnapshotIndex:
+    """Nearest-neighbour search straight over a snapshot's memory-mapped embeddings
+
+    By default queries scan the memory-mapped matrix with NumPy, so vectors stay
+    in the OS page cache and the process only holds one float per row.
+    ``use_faiss=True`` copies every vector into a FAISS flat index instead
+    (count x dimension x 4 bytes of RAM, e.g. 1.5 GB for 1M 384-d chunks) in
+    exchange for faster queries. Distances follow the collection's
+    ``hnsw:space`` (l2, cosine or ip) as Chroma reports them. Chunk texts are
+    read from ``chunks.jsonl`` by line offset, so only the results of a query
+    are ever parsed.
+    """
+
+    def __init__(self, snapshot_dir, verify=False, use_faiss=False):
+        self.snapshot_dir = snapshot_dir
+        self.manifest = load_manifest(snapshot_dir, verify=verify)
+        self.embeddings = np.load(os.path.join(snapshot_dir, EMBEDDINGS), mmap_mode='r')
+        self.space = (self.manifest.get('collection_metadata') or {}).get('hnsw:space', 'l2')
+        if self.space not in ('l2', 'cosine', 'ip'):
+            raise ValueError(f"Unsupported distance space '{self.space}' in {snapshot_dir}")
+
+        offsets = []
+        position = 0
+        with open(os.path.join(snapshot_dir, CHUNKS), 'rb') as f:
+            for line in f:
+                offsets.append(position)
+                position += len(line)
+        self._offsets = np.array(offsets, dtype=np.int64)
+
+        self._norms = None
+        self.faiss_index = None
+        if use_faiss:
+            import faiss
+
+            dimension = self.embeddings.shape[1]
+            if self.space == 'l2':
+                self.faiss_index = faiss.IndexFlatL2(dimension)
+            else:
+                self.faiss_index = faiss.IndexFlatIP(dimension)
+            for start in range(0, len(self), 65536):
+                vectors = np.array(self.embeddings[start:start + 65536], dtype=np.float32)
+                if self.space == 'cosine':
+                    faiss.normalize_L2(vectors)
+                self.faiss_index.add(vectors)
+
+    def __len__(self):
+        return self.embeddings.shape[0]
+
+    def chunk(self, row):
+        with open(os.path.join(self.snapshot_dir, CHUNKS), 'rb') as f:
+            f.seek(int(self._offsets[row]))
+            return json.loads(f.readline())
+
+    def search(self, query_embedding, n_results=5):
+        """Return [(row, distance)] for the closest chunks, with distances as Chroma reports them
+
+        l2 is the squared L2 distance, cosine is 1 - cosine similarity and ip
+        is 1 - inner product.
+        """
+        query = np.asarray(query_embedding, dtype=np.float32).reshape(1, -1)
+        k = min(n_results, len(self))
+        if k == 0:
+            return []
+        if self.space == 'cosine':
+            query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        if self.faiss_index is not None:
+            scores, rows = self.faiss_index.search(query, k)
+            distances = scores[0] if self.space == 'l2' else 1.0 - scores[0]
+            return [(int(r), float(d)) for r, d in zip(rows[0], distances) if r >= 0]
+
+        products = self.embeddings @ query[0]
+        if self.space == 'ip':
+            distances = 1.0 - products
+        else:
+            if self._norms is None:
+                self._norms = np.einsum('ij,ij->i', self.embeddings, self.embeddings)
+                if self.space == 'cosine':
+                    self._norms = np.sqrt(self._norms)
+            if self.space == 'cosine':
+                distances = 1.0 - products / np.maximum(self._norms, 1e-12)
+            else:
+                distances = self._norms - 2 * products + float(query[0] @ query[0])
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+        return [(int(r), float(distances[r])) for r in top]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export or bulk-load knowledge base snapshots")
+    parser.add_argument('command', choices=['export', 'import', 'verify'])
+    parser.add_argument('snapshot', help="snapshot directory")
+    parser.add_argument('--db', default='./chroma_db', help="ChromaDB persist directory")
+    parser.add_argument('--collection', default='agriculture_knowledge', help="collection to export or import into")
+    parser.add_argument('--model', default='all-MiniLM-L6-v2', help="embedding model the store is queried with")
+    parser.add_argument('--batch-size', type=int, default=5000, help="chunks per read/write batch")
+    parser.add_argument('--no-verify', action='store_true', help="skip checksum verification on import")
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'verify':
+            manifest = load_manifest(args.snapshot)
+            print(f"✅ {args.snapshot}: {manifest['count']} chunks, {manifest['dimension']}-d, "
+                  f"model {manifest['model_name']}, checksums OK")
+            sys.exit(0)
+
+        import chromadb
+
+        client = chromadb.PersistentClient(path=args.db)
+        if args.command == 'export':
+            export_snapshot(client.get_collection(name=args.collection), args.snapshot, args.model,
+                            batch_size=args.batch_size)
+        else:
+            import_snapshot(client, args.snapshot, model_name=args.model, collection_name=args.collection,
+                            batch_size=args.batch_size, verify=not args.no_verify)
+    except (OSError, ValueError) as e:
+        print(f"❌ Snapshot {args.command} failed: {str(e)}")
+        sys.exit(1)
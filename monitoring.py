@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Drift Monitoring for Farmer Guider AI
+Constant-memory sketches of served inputs and predictions, compared against the training data
+"""
+
+import json
+import os
+import threading
+import time
+import warnings
+from datetime import datetime
+
+import numpy as np
+
+# Quantile bins per feature; edges come from the training data so each bin holds ~1/BINS of it
+DEFAULT_BINS = 20
+
+# Population stability index thresholds commonly used for "watch" and "retrain"
+PSI_WARNING = 0.1
+PSI_ALERT = 0.25
+
+# Change in a feature's missing share (live minus training) reported as a warning.
+# Tracked apart from PSI: how often clients fill in optional fields is not value drift
+MISSING_SHARE_WARNING = 0.25
+
+# Live rows recorded before PSI is reported; a handful of requests fill only a few bins
+DEFAULT_MIN_ROWS = 200
+
+
+class FeatureSketch:
+    """Fixed-edge histograms for every schema feature plus predicted label counts
+
+    Each feature has ``len(edges) + 1`` value bins and one trailing bin for
+    missing values. Memory is features x bins + classes counters regardless
+    of traffic, and binning a batch is one vectorized comparison against the
+    edge matrix.
+    """
+
+    def __init__(self, features, edges, classes, counts=None, label_counts=None):
+        self.features = list(features)
+        self.edges = np.asarray(edges, dtype=np.float32)
+        self.classes = np.asarray(classes).astype(str)
+        self.n_bins = self.edges.shape[1] + 1
+        self.n_slots = self.n_bins + 1
+        self._class_index = {label: i for i, label in enumerate(self.classes.tolist())}
+
+        self._offsets = np.arange(len(self.features), dtype=np.intp) * self.n_slots
+        size = len(self.features) * self.n_slots
+        self.counts = np.zeros(size, dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64).ravel()
+        self.label_counts = (np.zeros(len(self.classes), dtype=np.int64) if label_counts is None
+                             else np.asarray(label_counts, dtype=np.int64))
+
+    @classmethod
+    def from_training(cls, features, X, labels, classes, bins=DEFAULT_BINS):
+        """Build edges from training quantiles and fill the sketch with the (unimputed) training rows
+
+        ``labels`` are the model's predictions for the rows of X, like the live
+        counts they are compared with.
+        """
+        X = np.asarray(X, dtype=np.float32)
+        quantiles = np.linspace(0, 1, bins + 1)[1:-1]
+        with warnings.catch_warnings():
+            # A feature missing from every training row has no quantiles
+            warnings.simplefilter('ignore', RuntimeWarning)
+            edges = np.nan_to_num(np.nanquantile(X, quantiles, axis=0).T, nan=0.0)
+        sketch = cls(features, edges, classes)
+        sketch.update(sketch.cells(X), labels)
+        return sketch
+
+    @property
+    def n_rows(self):
+        return int(self.label_counts.sum())
+
+    def cells(self, X):
+        """Flat counter index of every value in a float32 (rows, features) matrix; NaN is 'missing'"""
+        bins = (X[:, :, None] >= self.edges).sum(axis=2)
+        bins[np.isnan(X)] = self.n_bins
+        return (bins + self._offsets).ravel()
+
+    def update(self, cells, labels):
+        if len(labels) == 1:
+            # One row touches each feature once, so a plain fancy-index increment is safe
+            self.counts[cells] += 1
+            self.label_counts[self._class_index[str(labels[0])]] += 1
+            return
+
+        self.counts += np.bincount(cells, minlength=self.counts.size)
+        indices = np.searchsorted(self.classes, np.asarray(labels).astype(str))
+        self.label_counts += np.bincount(np.minimum(indices, len(self.classes) - 1), minlength=len(self.classes))
+
+    def histograms(self):
+        """(features, bins + 1) counts; the last column counts missing values"""
+        return self.counts.reshape(len(self.features), self.n_slots)
+
+    def missing_share(self):
+        return self.missing_share_of(self.features, self.histograms())
+
+    @staticmethod
+    def missing_share_of(features, histograms):
+        """Share of missing values per feature from (features, bins + 1) counts"""
+        totals = np.maximum(histograms.sum(axis=1), 1)
+        return {name: round(float(histograms[i, -1] / totals[i]), 4) for i, name in enumerate(features)}
+
+    def quantile(self, q):
+        """Approximate per-feature quantile of present values by interpolating inside the histogram bins"""
+        histograms = self.histograms()[:, :self.n_bins]
+        result = {}
+        for i, name in enumerate(self.features):
+            total = histograms[i].sum()
+            if total == 0:
+                result[name] = None
+                continue
+            cumulative = np.cumsum(histograms[i]) / total
+            b = int(np.searchsorted(cumulative, q))
+            edges = self.edges[i]
+            # Outer bins are open-ended; report their inner edge
+            low = edges[b - 1] if b > 0 else edges[0]
+            high = edges[b] if b < len(edges) else edges[-1]
+            before = cumulative[b - 1] if b > 0 else 0.0
+            share = (q - before) / max(cumulative[b] - before, 1e-12)
+            result[name] = round(float(low + (high - low) * min(max(share, 0.0), 1.0)), 4)
+        return result
+
+    def to_arrays(self):
+        return {
+            'features': np.array(self.features),
+            'edges': self.edges,
+            'classes': self.classes,
+            'counts': self.counts,
+            'label_counts': self.label_counts
+        }
+
+    def save(self, path):
+        np.savez(path, **self.to_arrays())
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as saved:
+            return cls([str(name) for name in saved['features']], saved['edges'], saved['classes'],
+                       counts=saved['counts'], label_counts=saved['label_counts'])
+
+
+def population_stability(expected, actual, epsilon=1e-4):
+    """PSI between two count vectors (0 means identical distributions)"""
+    expected = np.maximum(expected / max(expected.sum(), 1), epsilon)
+    actual = np.maximum(actual / max(actual.sum(), 1), epsilon)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+class DriftMonitor:
+    """Live sketch of served traffic, scored against the training reference
+
+    ``cells`` bins validated rows before imputation and ``observe`` records
+    them with the predicted labels; both run on the request path and cost a
+    few microseconds per row. Snapshots are written from a short-lived background thread at
+    most every ``snapshot_seconds``, one file per worker process.
+    """
+
+    def __init__(self, reference, snapshot_dir=None, snapshot_seconds=300, min_rows=DEFAULT_MIN_ROWS):
+        self.reference = reference
+        self.live = FeatureSketch(reference.features, reference.edges, reference.classes)
+        self.min_rows = min_rows
+        self.snapshot_dir = snapshot_dir
+        self.snapshot_seconds = snapshot_seconds
+        self.started_at = datetime.now().isoformat()
+
+        self._lock = threading.Lock()
+        self._last_snapshot = time.monotonic()
+        self._snapshot_running = False
+
+    @classmethod
+    def load(cls, path, features, classes, snapshot_dir=None, snapshot_seconds=300, min_rows=DEFAULT_MIN_ROWS):
+        """Load the training reference, or return None if it is missing or stale"""
+        if not os.path.exists(path):
+            return None
+        reference = FeatureSketch.load(path)
+        if reference.features != list(features) or list(reference.classes) != [str(c) for c in classes]:
+            print(f"⚠️  Ignoring {path}: it was built for a different model")
+            return None
+        if reference.label_counts.ndim != 1:
+            print(f"⚠️  Ignoring {path}: it was written by an older trainer; retrain to rebuild it")
+            return None
+        return cls(reference, snapshot_dir=snapshot_dir, snapshot_seconds=snapshot_seconds, min_rows=min_rows)
+
+    def cells(self, X):
+        """Bin served rows (NaN for missing features); call before imputing them"""
+        return self.live.cells(X)
+
+    def observe(self, cells, labels):
+        """Record binned feature rows and their predicted labels"""
+        with self._lock:
+            self.live.update(cells, labels)
+
+        if self.snapshot_dir and time.monotonic() - self._last_snapshot >= self.snapshot_seconds:
+            self._start_snapshot()
+
+    def drift(self):
+        """Per-feature and label PSI of live traffic against the training data
+
+        Feature PSI compares the distributions of present values only; a
+        feature with no present values on either side scores None. Missing
+        shares are reported separately under ``missing`` with their own
+        ``missing_status`` and do not affect ``status``. Below ``min_rows``
+        live rows the status is ``insufficient_data`` and nothing is scored.
+        """
+        with self._lock:
+            live_counts = self.live.histograms().copy()
+            live_labels = self.live.label_counts.copy()
+
+        n_rows = int(live_labels.sum())
+        if n_rows == 0 or n_rows < self.min_rows:
+            status = 'no_data' if n_rows == 0 else 'insufficient_data'
+            return {'status': status, 'rows': n_rows, 'min_rows': self.min_rows, 'since': self.started_at,
+                    'score': None, 'features': {}, 'label': None, 'missing': {}, 'missing_status': status}
+
+        n_bins = self.reference.n_bins
+        reference_counts = self.reference.histograms()
+        features = {}
+        for i, name in enumerate(self.reference.features):
+            expected, actual = reference_counts[i, :n_bins], live_counts[i, :n_bins]
+            features[name] = (round(population_stability(expected, actual), 4)
+                              if expected.sum() and actual.sum() else None)
+        label = round(population_stability(self.reference.label_counts, live_labels), 4)
+        worst = max([value for value in features.values() if value is not None] + [label])
+
+        if worst >= PSI_ALERT:
+            status = 'alert'
+        elif worst >= PSI_WARNING:
+            status = 'warning'
+        else:
+            status = 'ok'
+
+        reference_missing = self.reference.missing_share()
+        live_missing = FeatureSketch.missing_share_of(self.reference.features, live_counts)
+        missing = {name: {'reference': reference_missing[name], 'live': live_missing[name]}
+                   for name in self.reference.features}
+        missing_changed = any(abs(shares['live'] - shares['reference']) >= MISSING_SHARE_WARNING
+                              for shares in missing.values())
+
+        return {
+            'status': status,
+            'rows': n_rows,
+            'min_rows': self.min_rows,
+            'since': self.started_at,
+            'score': round(worst, 4),
+            'features': features,
+            'label': label,
+            'missing': missing,
+            'missing_status': 'warning' if missing_changed else 'ok'
+        }
+
+    def snapshot(self):
+        """Current drift report plus the raw live sketch"""
+        report = self.drift()
+        with self._lock:
+            report['histograms'] = self.live.histograms().tolist()
+            report['label_counts'] = dict(zip(self.live.classes.tolist(), self.live.label_counts.tolist()))
+            report['median'] = self.live.quantile(0.5)
+        report['written_at'] = datetime.now().isoformat()
+        return report
+
+    def write_snapshot(self):
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        path = os.path.join(self.snapshot_dir, f"drift_{stamp}_{os.getpid()}.json")
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(path + '.tmp', path)
+        return path
+
+    def _start_snapshot(self):
+        with self._lock:
+            if self._snapshot_running:
+                return
+            self._snapshot_running = True
+            self._last_snapshot = time.monotonic()
+
+        def run():
+            try:
+                self.write_snapshot()
+            except OSError as e:
+                print(f"⚠️  Could not write drift snapshot: {str(e)}")
+            finally:
+                self._snapshot_running = False
+
+        threading.Thread(target=run, name="drift-snapshot", daemon=True).start()
+
+    def prometheus_lines(self):
+        report = self.drift()
+        lines = [
+            "# HELP farmhelp_drift_psi Population stability index of served inputs against training data",
+            "# TYPE farmhelp_drift_psi gauge"
+        ]
+        for name, value in report['features'].items():
+            if value is not None:
+                lines.append(f'farmhelp_drift_psi{{feature="{name}"}} {value}')
+        if report['label'] is not None:
+            lines.append(f'farmhelp_drift_psi{{feature="label"}} {report["label"]}')
+        lines += [
+            "# HELP farmhelp_missing_share Share of served requests leaving a feature blank",
+            "# TYPE farmhelp_missing_share gauge"
+        ]
+        for name, shares in report['missing'].items():
+            lines.append(f'farmhelp_missing_share{{feature="{name}"}} {shares["live"]}')
+        lines += [
+            "# HELP farmhelp_monitored_predictions_total Predictions recorded by the drift monitor",
+            "# TYPE farmhelp_monitored_predictions_total counter",
+            f"farmhelp_monitored_predictions_total {report['rows']}"
+        ]
+        return lines
+
+
+def reference_path_for(model_path):
+    """Location of the training-data sketch written next to a model file"""
+    return os.path.join(os.path.dirname(os.path.abspath(model_path)), 'drift_reference.npz')
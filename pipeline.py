@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Pipeline Runner for Nax AI Training
+Runs training stages as a small DAG with input fingerprinting, shared resources and parallel execution
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class Stage:
+    """A pipeline step that declares its dependencies, input files and output files"""
+
+    def __init__(self, name, func, deps=None, inputs=None, outputs=None, params=None,
+                 cacheable=True, required=True):
+        self.name = name
+        self.func = func
+        self.deps = list(deps or [])
+        self.inputs = list(inputs or [])
+        self.outputs = list(outputs or [])
+        self.params = params
+        self.cacheable = cacheable
+        self.required = required
+
+
+class PipelineContext:
+    """Expensive objects shared between stages (one encoder, one DB client)"""
+
+    def __init__(self, profiler=None):
+        self.profiler = profiler
+        self._knowledge_processor = None
+        self._lock = threading.Lock()
+
+    @property
+    def profiling(self):
+        return self.profiler is not None and self.profiler.enabled
+
+    def knowledge_processor(self):
+        """Return the shared knowledge processor, creating it and its encoder on first use"""
+        with self._lock:
+            if self._knowledge_processor is None:
+                from knowledge_processor import AgricultureKnowledgeProcessor
+
+                processor = AgricultureKnowledgeProcessor(profiler=self.profiler)
+                processor.load_embedding_model()
+                self._knowledge_processor = processor
+            return self._knowledge_processor
+
+
+def file_fingerprint(path):
+    """Hash a file's contents, or mark it as missing"""
+    if not os.path.exists(path):
+        return 'missing'
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PipelineRunner:
+    """Schedules stages in dependency order, skipping those whose inputs are unchanged"""
+
+    def __init__(self, stages, state_file='.pipeline_state.json', max_workers=2, force=None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_file = state_file
+        self.max_workers = max_workers
+        self.force = set(force or [])
+        self.state = self._load_state()
+        self.report = []
+        self._state_lock = threading.Lock()
+
+        for stage in stages:
+            missing = [dep for dep in stage.deps if dep not in self.stages]
+            if missing:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stages: {missing}")
+
+    def _load_state(self):
+        if os.path.exists(self.state_file):
+            try:
+                with open(self.state_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                print(f"⚠️  Ignoring unreadable pipeline state in {self.state_file}")
+        return {}
+
+    def _save_state(self):
+        with open(self.state_file, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2)
+
+    def fingerprint(self, stage):
+        """Fingerprint a stage from its input files and parameters"""
+        digest = hashlib.sha256()
+        digest.update(stage.name.encode('utf-8'))
+        digest.update(json.dumps(stage.params, sort_keys=True, default=str).encode('utf-8'))
+        for path in stage.inputs:
+            digest.update(f"{path}={file_fingerprint(path)}".encode('utf-8'))
+        return digest.hexdigest()
+
+    def is_up_to_date(self, stage, fingerprint):
+        if not stage.cacheable or 'all' in self.force or stage.name in self.force:
+            return False
+        if not all(os.path.exists(path) for path in stage.outputs):
+            return False
+        return self.state.get(stage.name) == fingerprint
+
+    def _run_stage(self, stage, context):
+        """Run one stage unless cached, returning (status, seconds)"""
+        fingerprint = self.fingerprint(stage)
+        if self.is_up_to_date(stage, fingerprint):
+            print(f"⏭️  Skipping '{stage.name}' (inputs unchanged)")
+            return 'cached', 0.0
+
+        print(f"▶️  Running stage '{stage.name}'")
+        start = time.perf_counter()
+        if context.profiling:
+            with context.profiler.stage(stage.name):
+                ok = stage.func(context)
+        else:
+            ok = stage.func(context)
+        duration = time.perf_counter() - start
+
+        if not ok:
+            return 'failed', duration
+
+        if stage.cacheable:
+            with self._state_lock:
+                self.state[stage.name] = fingerprint
+                self._save_state()
+        return 'ran', duration
+
+    def run(self, context):
+        """Run the whole DAG, returning True unless a required stage failed"""
+        pending = dict(self.stages)
+        status = {}
+        running = {}
+
+        # Stage profiling is not thread-safe, so profiled runs are sequential
+        workers = 1 if context.profiling else self.max_workers
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while pending or running:
+                progressed = False
+                for name, stage in list(pending.items()):
+                    dep_status = [status.get(dep) for dep in stage.deps]
+                    if any(s in ('failed', 'blocked') for s in dep_status):
+                        print(f"⛔ Skipping '{name}' because a dependency failed")
+                        status[name] = 'blocked'
+                        self.report.append((name, 'blocked', 0.0))
+                        del pending[name]
+                        progressed = True
+                    elif all(s in ('ran', 'cached') for s in dep_status):
+                        running[executor.submit(self._run_stage, stage, context)] = name
+                        del pending[name]
+                        progressed = True
+
+                if not running:
+                    if pending and not progressed:
+                        raise ValueError(f"Dependency cycle between stages: {sorted(pending)}")
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        result, duration = future.result()
+                    except Exception as e:
+                        print(f"❌ Stage '{name}' raised: {str(e)}")
+                        result, duration = 'failed', 0.0
+                    status[name] = result
+                    self.report.append((name, result, duration))
+
+        return not any(status[name] in ('failed', 'blocked') and self.stages[name].required
+                       for name in status)
+
+    def print_report(self):
+        """Print per-stage status and timings"""
+        print("📊 Stage timings:")
+        for name, result, duration in self.report:
+            print(f"   {name:<24} {result:<8} {duration:8.2f}s")
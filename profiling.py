@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Profiling Hooks for Farmer Guider AI
+Opt-in cProfile and tracemalloc capture for Flask requests and pipeline stages
+"""
+
+import cProfile
+import hmac
+import json
+import os
+import random
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+
+def _safe_name(name):
+    """Turn a stage or endpoint name into a file-system friendly string"""
+    return re.sub(r'[^\w.-]+', '_', name).strip('_') or 'stage'
+
+
+class StageProfiler:
+    """Records wall time, a cProfile dump and peak memory for named pipeline stages"""
+
+    def __init__(self, output_dir=None, trace_memory=True):
+        self.output_dir = output_dir
+        self.enabled = output_dir is not None
+        self.trace_memory = trace_memory
+        self.results = []
+        self._depth = 0
+        self._peaks = []
+
+        if self.enabled:
+            os.makedirs(self.output_dir, exist_ok=True)
+
+    @contextmanager
+    def stage(self, name):
+        """Profile the enclosed block as one stage
+
+        Nested stages only record wall time and peak memory, since a single
+        cProfile session already covers everything inside the outer stage.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        outermost = self._depth == 0
+        profiler = cProfile.Profile() if outermost else None
+        started_tracing = False
+
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            else:
+                # Fold the enclosing stage's peak so far before resetting it
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], tracemalloc.get_traced_memory()[1])
+                tracemalloc.reset_peak()
+            self._peaks.append(0)
+
+        self._depth += 1
+        start = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+            duration = time.perf_counter() - start
+            self._depth -= 1
+
+            peak_bytes = None
+            if self.trace_memory:
+                peak_bytes = max(self._peaks.pop(), tracemalloc.get_traced_memory()[1])
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], peak_bytes)
+                if started_tracing:
+                    tracemalloc.stop()
+
+            result = {
+                'stage': name,
+                'depth': self._depth,
+                'seconds': round(duration, 4),
+                'peak_memory_bytes': peak_bytes
+            }
+
+            if profiler:
+                prof_path = os.path.join(self.output_dir, f"{len(self.results):02d}_{_safe_name(name)}.prof")
+                profiler.dump_stats(prof_path)
+                result['profile'] = prof_path
+
+            self.results.append(result)
+            peak_text = f", peak {peak_bytes / 1024 / 1024:.1f} MiB" if peak_bytes is not None else ""
+            print(f"⏱️  Stage '{name}' took {duration:.2f}s{peak_text}")
+
+    def write_summary(self, filename='summary.json'):
+        """Write all recorded stage results to a JSON summary"""
+        if not self.enabled:
+            return None
+
+        path = os.path.join(self.output_dir, filename)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'created_at': datetime.now().isoformat(),
+                'stages': self.results
+            }, f, indent=2)
+
+        print(f"📈 Profile summary written to {path}")
+        return path
+
+
+class RequestProfiler:
+    """Captures cProfile dumps for individual Flask requests
+
+    A request is profiled when it is picked by random sampling or, if a
+    shared ``token`` is configured, when its ``X-Profile`` header carries that
+    token. Overhead is bounded: only one request is profiled at a time and at
+    most ``max_per_minute`` profiles are written.
+    """
+
+    def __init__(self, output_dir, sample_rate=0.0, max_per_minute=6, token=None):
+        self.output_dir = output_dir
+        self.sample_rate = sample_rate
+        self.max_per_minute = max_per_minute
+        self.token = token
+
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_count = 0
+
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def _take_budget(self):
+        """Reserve a profiling slot in the current one-minute window"""
+        now = time.monotonic()
+        if now - self._window_start >= 60:
+            self._window_start = now
+            self._window_count = 0
+        if self._window_count >= self.max_per_minute:
+            return False
+        self._window_count += 1
+        return True
+
+    def requested(self, req):
+        """Whether the request asked to be profiled with the shared token"""
+        header = req.headers.get('X-Profile')
+        return bool(self.token and header) and hmac.compare_digest(header.encode(), self.token.encode())
+
+    def should_profile(self, req):
+        """Decide whether the given request should be profiled"""
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        return sampled or self.requested(req)
+
+    def start(self, req):
+        """Start profiling the request, returning the active profiler or None"""
+        if not self.should_profile(req):
+            return None
+        if not self._lock.acquire(blocking=False):
+            return None
+        if not self._take_budget():
+            self._lock.release()
+            return None
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def finish(self, profiler, req):
+        """Stop the profiler and write its stats, returning the output path"""
+        try:
+            profiler.disable()
+            stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+            endpoint = _safe_name(req.endpoint or req.path)
+            path = os.path.join(self.output_dir, f"request_{stamp}_{endpoint}.prof")
+            profiler.dump_stats(path)
+            return path
+        finally:
+            self._lock.release()
+
+
+def init_request_profiling(app):
+    """Register request profiling hooks on a Flask app when PROFILE_DIR is configured"""
+    output_dir = app.config.get('PROFILE_DIR')
+    if not output_dir:
+        return None
+
+    from flask import g, request
+
+    request_profiler = RequestProfiler(
+        output_dir,
+        sample_rate=app.config.get('PROFILE_SAMPLE_RATE', 0.0),
+        max_per_minute=app.config.get('PROFILE_MAX_PER_MINUTE', 6),
+        token=app.config.get('PROFILE_TOKEN')
+    )
+
+    @app.before_request
+    def _start_request_profile():
+        g._request_profiler = request_profiler.start(request)
+
+    @app.after_request
+    def _finish_request_profile(response):
+        profiler = g.pop('_request_profiler', None)
+        if profiler is not None:
+            path = request_profiler.finish(profiler, request)
+            # Only token holders learn where their profile was written
+            if request_profiler.requested(request):
+                response.headers['X-Profile-File'] = os.path.basename(path)
+        return response
+
+    @app.teardown_request
+    def _abort_request_profile(exc):
+        # Release the slot if the request failed before after_request ran
+        profiler = g.pop('_request_profiler', None)
+        if profiler is not None:
+            request_profiler.finish(profiler, request)
+
+    print(f"📈 Request profiling enabled (output: {output_dir}, sample rate: {request_profiler.sample_rate})")
+    return request_profiler
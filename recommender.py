@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Crop Recommender for Farmer Guider AI
+Fast class probabilities, calibrated top-k recommendations and a lookup-table fast path
+"""
+
+import os
+
+import numpy as np
+
+from feature_schema import LEGACY_FEATURES, fallback_path_for
+
+# Candidate temperatures searched when calibrating on held-out data
+CALIBRATION_GRID = np.geomspace(0.2, 5.0, 61)
+
+
+class ModelScorer:
+    """Class probabilities of one fitted model, laid out over a shared class list
+
+    Tree models are evaluated in a single pass over their trees: each tree's
+    normalized leaf distributions are precomputed into one table, so scoring
+    is one ``tree_.apply`` plus a table gather per tree instead of going
+    through scikit-learn's per-call parallel machinery.
+    """
+
+    def __init__(self, model, classes):
+        self.model = model
+        self.n_classes = len(classes)
+        self._columns = np.searchsorted(classes, model.classes_)
+
+        if hasattr(model, 'estimators_') and all(hasattr(est, 'tree_') for est in model.estimators_):
+            self._trees = [est.tree_ for est in model.estimators_]
+        elif hasattr(model, 'tree_'):
+            self._trees = [model.tree_]
+        else:
+            self._trees = []
+
+        if self._trees:
+            self._build_leaf_table()
+
+    def _build_leaf_table(self):
+        """Stack every tree's per-node class distribution, pre-divided by the tree count"""
+        tables = []
+        offsets = []
+        offset = 0
+        for tree in self._trees:
+            value = tree.value[:, 0, :].astype(np.float64)
+            totals = value.sum(axis=1, keepdims=True)
+            totals[totals == 0] = 1.0
+            table = np.zeros((len(value), self.n_classes), dtype=np.float32)
+            table[:, self._columns] = value / totals
+            tables.append(table)
+            offsets.append(offset)
+            offset += len(value)
+
+        self._leaf_table = np.concatenate(tables) / np.float32(len(self._trees))
+        self._offsets = np.array(offsets, dtype=np.intp)
+
+    def proba(self, X):
+        """Uncalibrated (rows, classes) probabilities for a float32 feature matrix"""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        proba = np.zeros((X.shape[0], self.n_classes), dtype=np.float32)
+
+        if self._trees:
+            for tree, offset in zip(self._trees, self._offsets):
+                proba += self._leaf_table[tree.apply(X) + offset]
+            return proba
+
+        if hasattr(self.model, 'predict_proba'):
+            try:
+                proba[:, self._columns] = self.model.predict_proba(X)
+                return proba
+            except AttributeError:
+                # e.g. SVC trained without probability=True
+                pass
+
+        # No probabilities available: one-hot of the predicted label
+        predicted = np.searchsorted(self.model.classes_, self.model.predict(X))
+        proba[np.arange(X.shape[0]), self._columns[predicted]] = 1.0
+        return proba
+
+
+class CropRecommender:
+    """Ranks crops for feature rows produced by a FeatureSchema
+
+    Rows may leave optional features blank (NaN). With a ``fallback_model``
+    (see FeatureSchema) such rows are scored by it on the fallback features;
+    without one they are imputed with the schema defaults. ``classes`` is the
+    union of both models' classes.
+    """
+
+    def __init__(self, model, schema, temperature=1.0, lut=None, fallback_model=None):
+        self.model = model
+        self.fallback_model = fallback_model
+        self.schema = schema
+        self.temperature = float(temperature)
+        self.lut = lut
+
+        self.classes = np.asarray(model.classes_)
+        if fallback_model is not None:
+            self.classes = np.union1d(self.classes, fallback_model.classes_)
+        self._scorer = ModelScorer(model, self.classes)
+        self._fallback_scorer = ModelScorer(fallback_model, self.classes) if fallback_model is not None else None
+
+    @property
+    def n_classes(self):
+        return len(self.classes)
+
+    def raw_proba(self, X):
+        """Uncalibrated class probabilities for a float32 feature matrix"""
+        X = np.asarray(X, dtype=np.float32)
+        if self._fallback_scorer is None:
+            if np.isnan(X).any():
+                X = self.schema.impute(X.copy())
+            return self._scorer.proba(X)
+
+        incomplete = self.schema.incomplete_rows(X)
+        if not incomplete.any():
+            return self._scorer.proba(X)
+        if incomplete.all():
+            return self._fallback_scorer.proba(X[:, self.schema.fallback_columns])
+
+        proba = np.empty((X.shape[0], self.n_classes), dtype=np.float32)
+        proba[~incomplete] = self._scorer.proba(X[~incomplete])
+        proba[incomplete] = self._fallback_scorer.proba(X[incomplete][:, self.schema.fallback_columns])
+        return proba
+
+    def calibrate(self, proba, temperature=None):
+        """Apply temperature scaling to probability rows"""
+        temperature = self.temperature if temperature is None else temperature
+        if temperature == 1.0:
+            return proba
+        scaled = np.power(np.maximum(proba, 1e-12), 1.0 / temperature)
+        return scaled / scaled.sum(axis=1, keepdims=True)
+
+    def predict_proba(self, X):
+        return self.calibrate(self.raw_proba(X))
+
+    def predict(self, X):
+        """Predicted labels; identical to the routed model's predict for tree models"""
+        return self.classes[np.argmax(self.raw_proba(X), axis=1)]
+
+    def fit_temperature(self, X, y):
+        """Choose the temperature minimizing log loss on held-out data"""
+        y = np.asarray(y)
+        known = np.isin(y, self.classes)
+        proba = self.raw_proba(X[known])
+        targets = np.searchsorted(self.classes, y[known])
+        rows = np.arange(len(targets))
+
+        best_temperature, best_loss = 1.0, np.inf
+        for temperature in CALIBRATION_GRID:
+            calibrated = self.calibrate(proba, temperature)
+            loss = -np.mean(np.log(np.maximum(calibrated[rows, targets], 1e-12)))
+            if loss < best_loss:
+                best_temperature, best_loss = float(temperature), loss
+
+        self.temperature = best_temperature
+        return best_temperature, best_loss
+
+    @staticmethod
+    def _select_top_k(proba, k):
+        """Best k class indices per row; equal probabilities rank by class index, as argmax does"""
+        k = min(k, proba.shape[1])
+        top = np.argsort(-proba, axis=1, kind='stable')[:, :k]
+        return top, np.take_along_axis(proba, top, axis=1)
+
+    def top_k(self, X, k=3):
+        """Return (class indices, confidences, lut_mask) for the k best crops per row"""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        indices = np.empty((X.shape[0], min(k, self.n_classes)), dtype=np.intp)
+        confidences = np.empty(indices.shape, dtype=np.float32)
+
+        hits, cells = self._lut_cells(X, k)
+        if hits.any():
+            indices[hits] = self.lut['indices'][cells[hits], :indices.shape[1]]
+            confidences[hits] = self.lut['confidences'][cells[hits], :indices.shape[1]]
+
+        misses = ~hits
+        if misses.any():
+            indices[misses], confidences[misses] = self._select_top_k(self.predict_proba(X[misses]), k)
+
+        return indices, confidences, hits
+
+    def recommend(self, X, k=3):
+        """Ranked recommendations for a single feature row, leaving out zero-confidence crops"""
+        indices, confidences, hits = self.top_k(X, k)
+        recommendations = [
+            {'crop': str(self.classes[i]), 'confidence': round(float(c), 4)}
+            for rank, (i, c) in enumerate(zip(indices[0], confidences[0]))
+            if rank == 0 or round(float(c), 4) > 0
+        ]
+        return recommendations, bool(hits[0])
+
+    # Lookup table over the quantized weather grid (N, P, K blank, or at their defaults
+    # for a schema without a fallback model)
+
+    def _lut_fill(self):
+        """Value the lookup table expects in every non-weather column"""
+        if self._fallback_scorer is not None:
+            return np.full(self.schema.n_features, np.nan, dtype=np.float32)
+        return self.schema.defaults
+
+    def build_lut(self, data, bins=20, k=3, low_pct=1, high_pct=99, chunk_size=65536):
+        """Precompute top-k for the centre of every cell of the common weather ranges"""
+        columns = [self.schema.index[name] for name in LEGACY_FEATURES]
+        values = np.column_stack([data[name].to_numpy(dtype=np.float64) for name in LEGACY_FEATURES])
+        low = np.nanpercentile(values, low_pct, axis=0)
+        high = np.nanpercentile(values, high_pct, axis=0)
+        step = (high - low) / bins
+
+        centres = [low[d] + (np.arange(bins) + 0.5) * step[d] for d in range(len(columns))]
+        grid = np.stack(np.meshgrid(*centres, indexing='ij'), axis=-1).reshape(-1, len(columns))
+
+        k = min(k, self.n_classes)
+        indices = np.empty((len(grid), k), dtype=np.uint8 if self.n_classes <= 256 else np.uint16)
+        confidences = np.empty((len(grid), k), dtype=np.float16)
+        for start in range(0, len(grid), chunk_size):
+            X = np.tile(self._lut_fill(), (min(chunk_size, len(grid) - start), 1))
+            X[:, columns] = grid[start:start + chunk_size]
+            top, top_proba = self._select_top_k(self.predict_proba(X), k)
+            indices[start:start + len(X)] = top
+            confidences[start:start + len(X)] = top_proba
+
+        self.lut = {
+            'columns': np.array(columns, dtype=np.intp),
+            'low': low.astype(np.float32),
+            'step': step.astype(np.float32),
+            'bins': bins,
+            'indices': indices,
+            'confidences': confidences
+        }
+        return self.lut
+
+    def _lut_cells(self, X, k):
+        """Rows answerable from the lookup table, and their flat cell indices"""
+        n = X.shape[0]
+        if self.lut is None or k > self.lut['indices'].shape[1]:
+            return np.zeros(n, dtype=bool), None
+
+        columns = self.lut['columns']
+        other = np.ones(self.schema.n_features, dtype=bool)
+        other[columns] = False
+
+        bins = self.lut['bins']
+        cells = np.floor((X[:, columns] - self.lut['low']) / self.lut['step']).astype(np.intp)
+        hits = np.all((cells >= 0) & (cells < bins), axis=1)
+        if self._fallback_scorer is not None:
+            hits &= np.all(np.isnan(X[:, other]), axis=1)
+        else:
+            hits &= np.all(X[:, other] == self.schema.defaults[other], axis=1)
+
+        flat = np.zeros(n, dtype=np.intp)
+        if hits.any():
+            flat[hits] = np.ravel_multi_index(cells[hits].T, (bins,) * len(columns))
+        return hits, flat
+
+    # Persistence
+
+    def save(self, path):
+        arrays = {'temperature': np.float64(self.temperature), 'classes': self.classes.astype(str)}
+        if self.lut is not None:
+            arrays.update({f"lut_{key}": np.asarray(value) for key, value in self.lut.items()})
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, model, schema, path, fallback_model=None):
+        """Build a recommender, restoring calibration and the lookup table if saved"""
+        recommender = cls(model, schema, fallback_model=fallback_model)
+        if not os.path.exists(path):
+            return recommender
+
+        with np.load(path, allow_pickle=False) as saved:
+            if list(saved['classes']) != [str(c) for c in recommender.classes]:
+                print(f"⚠️  Ignoring {path}: it was built for a different model")
+                return recommender
+
+            recommender.temperature = float(saved['temperature'])
+            if 'lut_indices' in saved:
+                lut = {key[4:]: saved[key] for key in saved.files if key.startswith('lut_')}
+                lut['bins'] = int(lut['bins'])
+                recommender.lut = lut
+            return recommender
+
+
+def recommender_path_for(model_path):
+    """Location of the recommender artifacts written next to a model file"""
+    return os.path.join(os.path.dirname(os.path.abspath(model_path)), 'recommender.npz')
+
+
+def load_recommender(model, schema, model_path):
+    """Recommender for a loaded model, with the schema's fallback model and saved artifacts"""
+    fallback_model = None
+    fallback_path = fallback_path_for(model_path, schema)
+    if fallback_path:
+        import joblib
+        fallback_model = joblib.load(fallback_path)
+    return CropRecommender.load(model, schema, recommender_path_for(model_path), fallback_model=fallback_model)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Retrieval Post-processing for Nax AI
+Collapses overlapping chunk hits, stitches neighbouring chunks and diversifies results with MMR
+"""
+
+from typing import Any, Dict, List
+
+import numpy as np
+
+
+def chunk_id(url: str, chunk_index: int) -> str:
+    """ID a chunk is stored under; process_article() numbers chunks per article URL"""
+    return f"{url}_{chunk_index}"
+
+
+def stitch(left: str, right: str, max_overlap: int = 50) -> str:
+    """Join two consecutive chunks, dropping the words they share"""
+    left_words = left.split()
+    right_words = right.split()
+    for size in range(min(len(left_words), len(right_words), max_overlap), 0, -1):
+        if left_words[-size:] == right_words[:size]:
+            return ' '.join(left_words + right_words[size:])
+    return ' '.join(left_words + right_words)
+
+
+def collapse_by_url(hits: List[Dict[str, Any]], max_overlap: int = 50) -> List[int]:
+    """Keep the best hit per article URL, stitching in other hits adjacent to it
+
+    ``hits`` are ordered best first. The kept hit's ``content`` is replaced by
+    the stitched run of consecutive chunks and ``chunk_range`` records its
+    first and last chunk index. Returns the positions of the kept hits.
+    """
+    by_url = {}
+    for position, hit in enumerate(hits):
+        by_url.setdefault(hit['url'], []).append(position)
+
+    kept = []
+    for position, hit in enumerate(hits):
+        group = by_url[hit['url']]
+        if group[0] != position:
+            continue
+        kept.append(position)
+
+        texts = {hits[p]['chunk_index']: hits[p]['content'] for p in group}
+        first = last = hit['chunk_index']
+        while first - 1 in texts:
+            first -= 1
+        while last + 1 in texts:
+            last += 1
+        if first != last:
+            content = texts[first]
+            for index in range(first + 1, last + 1):
+                content = stitch(content, texts[index], max_overlap)
+            hit['content'] = content
+        hit['chunk_range'] = [first, last]
+    return kept
+
+
+def mmr_select(query: np.ndarray, candidates: np.ndarray, k: int, diversity: float = 0.3) -> List[int]:
+    """Maximal marginal relevance over a candidate set, returning selected row positions
+
+    ``diversity`` trades relevance (0.0) against novelty (1.0). Similarities
+    are cosine, computed once as one candidate x candidate matrix product.
+    """
+    candidates = np.asarray(candidates, dtype=np.float32)
+    if len(candidates) == 0:
+        return []
+
+    norms = np.linalg.norm(candidates, axis=1, keepdims=True)
+    candidates = candidates / np.maximum(norms, 1e-12)
+    query = np.asarray(query, dtype=np.float32)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = candidates @ query
+    similarity = candidates @ candidates.T
+
+    selected = []
+    closest = np.zeros(len(candidates), dtype=np.float32)
+    available = np.ones(len(candidates), dtype=bool)
+    for _ in range(min(k, len(candidates))):
+        scores = (1.0 - diversity) * relevance - diversity * closest
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        closest = np.maximum(closest, similarity[best])
+    return selected
+
+
+def expand_neighbours(collection, hits: List[Dict[str, Any]], neighbours: int = 1, max_overlap: int = 50):
+    """Stitch up to ``neighbours`` chunks on each side of every hit, in place
+
+    Neighbour IDs follow from each hit's URL, chunk index and chunk count, so
+    all of them are fetched with one ID lookup instead of extra vector queries.
+    """
+    wanted = {}
+    for hit in hits:
+        first, last = hit.setdefault('chunk_range', [hit['chunk_index'], hit['chunk_index']])
+        total = hit.get('total_chunks') or last + 1
+        for index in range(max(first - neighbours, 0), min(last + neighbours + 1, total)):
+            if not first <= index <= last:
+                wanted[chunk_id(hit['url'], index)] = (hit['url'], index)
+
+    if not wanted:
+        return hits
+
+    fetched = collection.get(ids=list(wanted), include=['documents'])
+    texts = {wanted[id_]: doc for id_, doc in zip(fetched['ids'], fetched['documents'])}
+
+    for hit in hits:
+        first, last = hit['chunk_range']
+        content = hit['content']
+        for _ in range(neighbours):
+            if (hit['url'], first - 1) not in texts:
+                break
+            first -= 1
+            content = stitch(texts[(hit['url'], first)], content, max_overlap)
+        for _ in range(neighbours):
+            if (hit['url'], last + 1) not in texts:
+                break
+            last += 1
+            content = stitch(content, texts[(hit['url'], last)], max_overlap)
+        hit['content'] = content
+        hit['chunk_range'] = [first, last]
+    return hits
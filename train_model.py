@@ -6,6 +6,11 @@ import numpy as np
 import requests
 from datetime import datetime
 import time
+import argparse
+from profiling import StageProfiler
+from feature_schema import FALLBACK_FEATURES, FeatureSchema, fallback_path_for, schema_path_for
+from recommender import CropRecommender, recommender_path_for
+from monitoring import FeatureSketch, reference_path_for
 
 def generate_synthetic_data(n_samples=100):
     """Generate synthetic agricultural data for training"""
@@ -79,13 +84,48 @@ def load_and_combine_data():
     print(f"🎯 Final dataset: {len(final_data)} samples")
     return final_data
 
-def train_enhanced_model():
+def build_recommender(model, fallback_model, schema, data, X_test, y_test, calibrate=True, lut_bins=24):
+    """Fit top-k calibration and the quantized lookup table for the chosen model"""
+    recommender = CropRecommender(model, schema, fallback_model=fallback_model)
+
+    # Held-out accuracy of complete rows as sent, and with N, P, K blanked like weather-only clients
+    complete = ~schema.incomplete_rows(X_test)
+    X_blank = X_test[complete].copy()
+    X_blank[:, schema.optional_columns] = np.nan
+    full_accuracy = (recommender.predict(X_test[complete]) == y_test[complete]).mean()
+    blank_accuracy = (recommender.predict(X_blank) == y_test[complete]).mean()
+    print(f"🎯 Held-out accuracy: {full_accuracy:.4f} with N/P/K, {blank_accuracy:.4f} with N/P/K blanked "
+          f"({complete.sum()} rows)")
+
+    if calibrate:
+        temperature, loss = recommender.fit_temperature(X_test, y_test)
+        print(f"🎯 Calibration temperature: {temperature:.3f} (held-out log loss {loss:.4f})")
+
+    if lut_bins:
+        lut = recommender.build_lut(data, bins=lut_bins)
+
+        # How often the lookup table's top crop matches the exact path (N, P, K blank)
+        X_check = np.array(X_test, dtype=np.float32)
+        other = np.setdiff1d(np.arange(schema.n_features), lut['columns'])
+        X_check[:, other] = np.nan
+        lut_top, _, hits = recommender.top_k(X_check, k=1)
+        exact_top = np.argmax(recommender.predict_proba(X_check), axis=1)
+        agreement = (lut_top[hits, 0] == exact_top[hits]).mean() if hits.any() else float('nan')
+        print(f"🗂️  Lookup table: {lut_bins}^4 cells, covers {hits.mean():.1%} of test rows, "
+              f"top-1 agreement {agreement:.1%}")
+
+    return recommender
+
+def train_enhanced_model(profiler=None, calibrate=True, lut_bins=24):
     """Train the enhanced crop prediction model"""
     print("🚀 Starting Enhanced Crop Prediction Model Training")
     print("=" * 60)
 
+    profiler = profiler or StageProfiler()
+
     # Load and combine data
-    data = load_and_combine_data()
+    with profiler.stage('load_data'):
+        data = load_and_combine_data()
 
     if data.empty:
         print("❌ No data available for training")
@@ -95,20 +135,28 @@ def train_enhanced_model():
     data = data.dropna(subset=['label'])
     data['label'] = data['label'].astype(str).str.lower()
 
-    # Prepare features and target
-    X = data[['temperature', 'humidity', 'ph', 'rainfall']]
-    y = data['label']
+    # Prepare features and target: fixed schema order, float32, NPK left blank (NaN) where missing.
+    # The full model learns from rows with every feature, the fallback model from the weather
+    # features of all rows; rows missing N, P or K are routed to the fallback when serving
+    schema = FeatureSchema.from_frame(data, fallback_features=FALLBACK_FEATURES)
+    X = schema.transform_frame(data, impute=False)
+    y = data['label'].to_numpy()
 
     print(f"📈 Training with {len(X)} samples")
-    print(f"🌾 Target crops: {y.unique()}")
+    print(f"🌾 Target crops: {pd.unique(y)}")
 
     # Split data
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    complete = ~schema.incomplete_rows(X)
+    train_complete = ~schema.incomplete_rows(X_train)
+    test_complete = ~schema.incomplete_rows(X_test)
+    print(f"🧪 {complete.sum()} samples have N, P and K; {(~complete).sum()} only train the fallback model")
 
     # Try multiple models for best accuracy
     from sklearn.ensemble import RandomForestClassifier
     from sklearn.svm import SVC
     from sklearn.model_selection import cross_val_score
+    from sklearn.base import clone
 
     models = {
         'DecisionTree': DecisionTreeClassifier(random_state=42),
@@ -124,13 +172,14 @@ def train_enhanced_model():
     print("=" * 60)
 
     for name, model in models.items():
-        # Cross-validation for better evaluation
-        cv_scores = cross_val_score(model, X, y, cv=5)
-        mean_cv_accuracy = cv_scores.mean()
+        with profiler.stage(f'evaluate_{name}'):
+            # Cross-validation for better evaluation
+            cv_scores = cross_val_score(model, X[complete], y[complete], cv=5)
+            mean_cv_accuracy = cv_scores.mean()
 
-        # Train and test
-        model.fit(X_train, y_train)
-        test_accuracy = model.score(X_test, y_test)
+            # Train and test
+            model.fit(X_train[train_complete], y_train[train_complete])
+            test_accuracy = model.score(X_test[test_complete], y_test[test_complete])
 
         print(f"{name}:")
         print(f"   Cross-Val Accuracy: {mean_cv_accuracy:.4f} (+/- {cv_scores.std() * 2:.4f})")
@@ -145,22 +194,57 @@ def train_enhanced_model():
     print(f"🏆 Best Model: {best_name} with Test Accuracy: {best_accuracy:.4f}")
     print("=" * 60)
 
-    # Use the best model
+    # Use the best model, and the same kind of model on the fallback features alone
     model = best_model
-
-    # Save model
-    joblib.dump(model, "model.pkl")
-    print("💾 Model saved as model.pkl")
-
-    # Save enhanced dataset for future use
-    data.to_csv("enhanced_farmer_data.csv", index=False)
-    print("💾 Enhanced dataset saved as enhanced_farmer_data.csv")
-
+    with profiler.stage('fallback_model'):
+        fallback_model = clone(best_model)
+        fallback_model.fit(X_train[:, schema.fallback_columns], y_train)
+        fallback_accuracy = fallback_model.score(X_test[:, schema.fallback_columns], y_test)
+    print(f"🌦️  Fallback {best_name} on {', '.join(schema.fallback_features)}: Test Accuracy {fallback_accuracy:.4f}")
+
+    with profiler.stage('recommender'):
+        recommender = build_recommender(model, fallback_model, schema, data, X_test, y_test,
+                                        calibrate=calibrate, lut_bins=lut_bins)
+
+    with profiler.stage('save'):
+        # Save model
+        joblib.dump(model, "model.pkl")
+        print("💾 Model saved as model.pkl")
+        joblib.dump(fallback_model, fallback_path_for("model.pkl", schema))
+        print(f"💾 Fallback model saved as {schema.fallback_model}")
+
+        # Save the feature schema the serving side uses to build inputs
+        schema.save(schema_path_for("model.pkl"))
+        print(f"💾 Feature schema v{schema.version} saved as feature_schema.json ({', '.join(schema.features)})")
+
+        # Save calibration and the lookup table used for top-k recommendations
+        recommender.save(recommender_path_for("model.pkl"))
+        print("💾 Recommender saved as recommender.npz")
+
+        # Save training-data sketches the server compares live traffic against. Label counts
+        # are the recommender's own predictions, like the live counts they are compared with
+        reference = FeatureSketch.from_training(schema.features, X, recommender.predict(X), recommender.classes)
+        reference.save(reference_path_for("model.pkl"))
+        print("💾 Drift reference saved as drift_reference.npz")
+
+        # Save enhanced dataset for future use
+        data.to_csv("enhanced_farmer_data.csv", index=False)
+        print("💾 Enhanced dataset saved as enhanced_farmer_data.csv")
+
+    profiler.write_summary()
     print("✅ Enhanced model training completed!")
     return True
 
 if __name__ == "__main__":
-    success = train_enhanced_model()
+    parser = argparse.ArgumentParser(description="Train the enhanced crop prediction model")
+    parser.add_argument('--profile', metavar='DIR', help="write per-stage cProfile dumps and peak memory to DIR")
+    parser.add_argument('--no-calibration', action='store_true', help="skip fitting top-k probability calibration")
+    parser.add_argument('--lut-bins', type=int, default=24,
+                        help="bins per weather feature for the recommendation lookup table (0 disables it)")
+    args = parser.parse_args()
+
+    success = train_enhanced_model(profiler=StageProfiler(args.profile),
+                                   calibrate=not args.no_calibration, lut_bins=args.lut_bins)
     if success:
         print("\n🎉 Model enhancement successful! Ready for improved predictions.")
     else:
@@ -1,15 +1,19 @@
 #!/usr/bin/env python3
 """
 Training Script for Nax AI Assistant
-Runs the complete training pipeline: data collection -> knowledge processing -> testing
+Runs the complete training pipeline as a DAG:
+data collection -> knowledge processing -> testing, with crop model training alongside
 """
 
 import os
 import sys
 import time
+import argparse
 from datetime import datetime
+from profiling import StageProfiler
+from pipeline import Stage, PipelineContext, PipelineRunner
 
-def run_data_collection():
+def run_data_collection(context):
     """Run the data collection process"""
     print("🌾 Starting Data Collection Phase")
     print("=" * 50)
@@ -18,7 +22,7 @@ def run_data_collection():
         # Import and run data collector
         from data_collector import AgricultureDataCollector
 
-        collector = AgricultureDataCollector()
+        collector = AgricultureDataCollector(profiler=context.profiler)
         data = collector.run_collection()
 
         print(f"✅ Data collection completed! Collected {len(data)} articles.")
@@ -28,17 +32,31 @@ def run_data_collection():
         print(f"❌ Data collection failed: {str(e)}")
         return False
 
-def run_knowledge_processing():
+def run_crop_model_training(context):
+    """Train the crop prediction model"""
+    print("\n🌱 Starting Crop Model Training Phase")
+    print("=" * 50)
+
+    try:
+        from train_model import train_enhanced_model
+
+        return train_enhanced_model(profiler=context.profiler)
+
+    except Exception as e:
+        print(f"❌ Crop model training failed: {str(e)}")
+        return False
+
+def run_knowledge_processing(context):
     """Run the knowledge processing and embedding creation"""
     print("\n🧠 Starting Knowledge Processing Phase")
     print("=" * 50)
 
     try:
-        # Import and run knowledge processor
-        from knowledge_processor import AgricultureKnowledgeProcessor
-
-        processor = AgricultureKnowledgeProcessor()
-        processor.load_and_process_data()
+        # Shared processor: the encoder and DB client are reused by the testing stage
+        processor = context.knowledge_processor()
+        if not processor.load_and_process_data():
+            print("❌ Knowledge processing failed")
+            return False
 
         # Get stats
         stats = processor.get_stats()
@@ -51,15 +69,13 @@ def run_knowledge_processing():
         print(f"❌ Knowledge processing failed: {str(e)}")
         return False
 
-def test_knowledge_base():
+def test_knowledge_base(context):
     """Test the knowledge base with sample queries"""
     print("\n🧪 Testing Knowledge Base")
     print("=" * 50)
 
     try:
-        from knowledge_processor import AgricultureKnowledgeProcessor
-
-        processor = AgricultureKnowledgeProcessor()
+        processor = context.knowledge_processor()
 
         # Sample test queries
         test_queries = [
@@ -89,7 +105,30 @@ def test_knowledge_base():
         print(f"❌ Knowledge base testing failed: {str(e)}")
         return False
 
-def main():
+def build_stages():
+    """Declare the training stages with their dependencies, inputs and outputs"""
+    return [
+        # Each stage's inputs include the modules that build its outputs, so code changes
+        # invalidate cached results. Re-scrape only when the collector changes; use
+        # --force data_collection to refresh
+        Stage('data_collection', run_data_collection,
+              inputs=['data_collector.py'],
+              outputs=['agriculture_knowledge_base.json']),
+        Stage('crop_model', run_crop_model_training,
+              inputs=['farmer_data.csv', 'crops_dataset.csv',
+                      'train_model.py', 'feature_schema.py', 'recommender.py', 'monitoring.py'],
+              outputs=['model.pkl', 'model_fallback.pkl', 'feature_schema.json', 'recommender.npz', 'drift_reference.npz']),
+        Stage('knowledge_processing', run_knowledge_processing,
+              deps=['data_collection'],
+              inputs=['agriculture_knowledge_base.json', 'knowledge_processor.py', 'retrieval.py'],
+              outputs=['chroma_db'],
+              params={'model_name': 'all-MiniLM-L6-v2'}),
+        Stage('testing', test_knowledge_base,
+              deps=['knowledge_processing'],
+              cacheable=False, required=False)
+    ]
+
+def main(profile_dir=None, force=None, max_workers=2):
     """Main training pipeline"""
     print("🚀 Starting Nax AI Training Pipeline")
     print("=" * 60)
@@ -97,19 +136,16 @@ def main():
     print("=" * 60)
 
     start_time = time.time()
+    profiler = StageProfiler(profile_dir)
+    context = PipelineContext(profiler=profiler)
+    runner = PipelineRunner(build_stages(), max_workers=max_workers, force=force)
 
-    # Phase 1: Data Collection
-    if not run_data_collection():
-        print("❌ Training pipeline failed at data collection phase")
-        return False
-
-    # Phase 2: Knowledge Processing
-    if not run_knowledge_processing():
-        print("❌ Training pipeline failed at knowledge processing phase")
-        return False
+    success = runner.run(context)
+    profiler.write_summary()
 
-    # Phase 3: Testing
-    if not test_knowledge_base():
+    if not success:
+        print("❌ Training pipeline failed")
+    elif any(result == 'failed' for _, result, _ in runner.report):
         print("⚠️  Knowledge base testing failed, but training completed")
     else:
         print("✅ All training phases completed successfully!")
@@ -121,12 +157,20 @@ def main():
     print("\n" + "=" * 60)
     print("🎉 Nax AI Training Summary:")
     print(f"   Duration: {training_duration:.2f} seconds ({training_duration/60:.2f} minutes)")
-    print("   Status: Training pipeline completed")
+    print(f"   Status: Training pipeline {'completed' if success else 'failed'}")
+    runner.print_report()
     print("   Next: Start the Flask app to test Nax with enhanced knowledge")
     print("=" * 60)
 
-    return True
+    return success
 
 if __name__ == "__main__":
-    success = main()
+    parser = argparse.ArgumentParser(description="Run the Nax AI training pipeline")
+    parser.add_argument('--profile', metavar='DIR', help="write per-stage cProfile dumps and peak memory to DIR")
+    parser.add_argument('--force', action='append', metavar='STAGE',
+                        help="rerun STAGE even if its inputs are unchanged ('all' reruns everything)")
+    parser.add_argument('--workers', type=int, default=2, help="number of stages to run in parallel")
+    args = parser.parse_args()
+
+    success = main(profile_dir=args.profile, force=args.force, max_workers=args.workers)
     sys.exit(0 if success else 1)
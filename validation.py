@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Request Validation for Farmer Guider AI
+Rejects malformed, oversized or out-of-range prediction payloads before any model work
+"""
+
+import threading
+from collections import Counter
+
+
+class ValidationError(Exception):
+    """A rejected request, rendered as a structured 4xx response"""
+
+    def __init__(self, code, message, status=400, field=None, rows=None):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status = status
+        self.field = field
+        self.rows = rows
+
+    def to_dict(self):
+        body = {"error": self.message, "code": self.code}
+        if self.field is not None:
+            body["field"] = self.field
+        if self.rows is not None:
+            body["rows"] = self.rows
+        return body
+
+
+class RejectionCounter:
+    """Thread-safe counts of rejected requests by endpoint and reason"""
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def increment(self, endpoint, reason):
+        with self._lock:
+            self._counts[(endpoint or 'unknown', reason)] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+    def prometheus_lines(self):
+        """Counters in Prometheus text exposition format"""
+        lines = [
+            "# HELP farmhelp_rejected_requests_total Prediction requests rejected by validation",
+            "# TYPE farmhelp_rejected_requests_total counter"
+        ]
+        for (endpoint, reason), count in sorted(self.snapshot().items()):
+            lines.append(f'farmhelp_rejected_requests_total{{endpoint="{endpoint}",reason="{reason}"}} {count}')
+        return lines
+
+
+rejections = RejectionCounter()
+
+
+def _from_feature_error(error):
+    return ValidationError(error.code, str(error), field=error.field, rows=error.rows)
+
+
+def validate_row(schema, mapping, impute=True):
+    """Validate a single form or JSON mapping into a (1, n_features) float32 row"""
+    from feature_schema import FeatureValueError
+
+    try:
+        return schema.row_from_mapping(mapping, impute=impute)
+    except FeatureValueError as e:
+        raise _from_feature_error(e)
+
+
+def validate_json_payload(schema, data, max_batch, impute=True):
+    """Validate a JSON prediction body, returning (X, is_batch)
+
+    Accepted shapes: a single object of features, ``{"instances": [{...}, ...]}``
+    or column-oriented ``{"columns": {"temperature": [...], ...}}``. Batches are
+    size-checked before any conversion and then validated column-wise.
+    """
+    from feature_schema import FeatureValueError
+
+    if not isinstance(data, dict):
+        raise ValidationError('invalid_json', "Expected a JSON object")
+
+    if 'instances' not in data and 'columns' not in data:
+        return validate_row(schema, data, impute=impute), False
+
+    try:
+        if 'instances' in data:
+            instances = data['instances']
+            if not isinstance(instances, list) or not instances:
+                raise ValidationError('invalid_batch', "'instances' must be a non-empty list")
+            if len(instances) > max_batch:
+                raise ValidationError('batch_too_large', f"At most {max_batch} instances per request", status=413)
+            return schema.matrix_from_records(instances, impute=impute), True
+
+        columns = data['columns']
+        if not isinstance(columns, dict) or not columns:
+            raise ValidationError('invalid_batch', "'columns' must be an object of equal-length lists")
+        lengths = {len(values) for values in columns.values() if isinstance(values, (list, tuple))}
+        if len(lengths) != 1 or len(columns) != sum(isinstance(v, (list, tuple)) for v in columns.values()):
+            raise ValidationError('invalid_batch', "'columns' must be an object of equal-length lists")
+        n_rows = lengths.pop()
+        if n_rows == 0:
+            raise ValidationError('invalid_batch', "'columns' must not be empty")
+        if n_rows > max_batch:
+            raise ValidationError('batch_too_large', f"At most {max_batch} rows per request", status=413)
+        return schema.matrix_from_columns(columns, n_rows, impute=impute), True
+
+    except FeatureValueError as e:
+        raise _from_feature_error(e)
+
+
+def init_validation(app):
+    """Register structured error responses and rejection counting on a Flask app"""
+    from flask import jsonify, request
+    from werkzeug.exceptions import RequestEntityTooLarge
+
+    @app.errorhandler(ValidationError)
+    def _handle_validation_error(error):
+        rejections.increment(request.endpoint, error.code)
+        if request.path.startswith('/api/'):
+            return jsonify(error.to_dict()), error.status
+        return f"Error: {error.message}", error.status
+
+    @app.errorhandler(RequestEntityTooLarge)
+    def _handle_too_large(error):
+        limit = app.config.get('MAX_CONTENT_LENGTH')
+        return _handle_validation_error(
+            ValidationError('body_too_large', f"Request body exceeds {limit} bytes", status=413))